@@ -0,0 +1,220 @@
+"""
+Microbenchmarks of the FSM engine stages on synthetic data.
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --events 200 --fanout 4 --depth 3 --compare bench.json
+
+Each stage is timed on its own: everything it needs is rebuilt before every repeat
+and is not part of the measurement.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+from src.config import START_CLASS, MAX_DEPTH, TRIPLE_BACKEND
+from src.fsm import FSMEngine
+from src.mapper import StringMapper
+from .synthetic import SyntheticSchema, user_triples
+
+STAGES = ('find_ontology_paths', 'store_triples', 'find_triple_paths', 'generate_candidate', 'chunking')
+
+
+def threshold_for(events):
+    """min_support as process_single_user computes it."""
+    if events > 100:
+        return 4
+    if events >= 8:
+        return int(math.log(events))
+    return 2
+
+
+class Workload:
+    def __init__(self, args, directory=None):
+        """directory: where the schema file is written; a new temporary directory by default."""
+        self.args = args
+        self.schema = SyntheticSchema(args.fanout, args.depth, args.cross_links, args.seed)
+        self.schema_file = os.path.join(directory or tempfile.mkdtemp(prefix='fsm_bench_'), 'schema.csv')
+        self.schema.write(self.schema_file)
+        self.rows = user_triples(self.schema, args.events, args.movies, args.values, args.pool, args.seed)
+        self.threshold = threshold_for(args.events)
+
+    @classmethod
+    def from_params(cls, directory=None, **params):
+        """Workload with the command line defaults, changed by params (e.g. events=60, backend='columnar')."""
+        args = build_parser().parse_args([])
+        unknown = set(params) - set(vars(args))
+        if unknown:
+            raise TypeError(f"Unknown workload parameters: {', '.join(sorted(unknown))}")
+        vars(args).update(params)
+        return cls(args, directory)
+
+    def engine(self):
+        """Fresh engine with the schema loaded. Returns (engine, ontology_graph)."""
+        engine = FSMEngine(StringMapper(), backend=self.args.backend)
+        property_dict, ontology_graph, _ = engine.load_schema(self.schema_file)
+        engine.property_dict = property_dict
+        return engine, ontology_graph
+
+    def with_paths(self):
+        engine, ontology_graph = self.engine()
+        engine.ontology_path_list, engine.path_property_set = engine.find_ontology_paths(
+            START_CLASS, self.schema.end_classes, ontology_graph, self.args.max_depth)
+        return engine
+
+    def with_triples(self):
+        engine = self.with_paths()
+        start_instances, triple_dict, engine.prop_triples_dict, engine.triple_index = engine.store_triples(
+            self.rows, START_CLASS)
+        return engine, start_instances, triple_dict
+
+    def with_it_hash(self):
+        engine, start_instances, triple_dict = self.with_triples()
+        triple_paths_dict = engine.find_all_triple_paths(START_CLASS, start_instances)
+
+        itid_tr = {}
+        for start_instance, triple_paths in triple_paths_dict.items():
+            for path in triple_paths:
+                for tid in path:
+                    itid_tr.setdefault(tid, start_instance)
+        triple_dict = {tid: t for tid, t in triple_dict.items() if tid in itid_tr}
+
+        engine.prop_chunk_type_dict = engine.get_chunking_type()
+        return engine, engine.build_it_hash(triple_dict, itid_tr), itid_tr
+
+    def with_candidates(self):
+        engine, it_hash, itid_tr = self.with_it_hash()
+        candi_it_tr, same_itids = engine.generate_candidate(it_hash=it_hash, itid_tr=itid_tr, threshold=self.threshold)
+        engine.assign_same_codes(it_hash, same_itids)
+        candidates = same_itids[next(iter(candi_it_tr))] if candi_it_tr else None
+        return engine, it_hash, itid_tr, candidates
+
+
+def stage_runs(workload):
+    """{stage: (setup, run)}; run(setup()) is the timed call."""
+    threshold = workload.threshold
+    max_depth = workload.args.max_depth
+
+    def chunking_run(state):
+        engine, it_hash, itid_tr, candidates = state
+        if candidates is not None:
+            engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=threshold)
+
+    return {
+        'find_ontology_paths': (
+            workload.engine,
+            lambda state: state[0].find_ontology_paths(START_CLASS, workload.schema.end_classes, state[1], max_depth)),
+        'store_triples': (
+            workload.with_paths,
+            lambda engine: engine.store_triples(workload.rows, START_CLASS)),
+        'find_triple_paths': (
+            workload.with_triples,
+            lambda state: state[0].find_all_triple_paths(START_CLASS, state[1])),
+        'generate_candidate': (
+            workload.with_it_hash,
+            lambda state: state[0].generate_candidate(it_hash=state[1], itid_tr=state[2], threshold=threshold)),
+        'chunking': (workload.with_candidates, chunking_run),
+    }
+
+
+def measure(setup, run, repeat):
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.fmean(timings),
+            'repeat': repeat}
+
+
+def workload_counters(workload, stages):
+    """Sizes of the workload, going only as far into the pipeline as the benchmarked stages do."""
+    counters = {'schema_properties': len(workload.schema.properties), 'triples': len(workload.rows),
+                'threshold': workload.threshold}
+    counters['ontology_paths'] = len(workload.with_paths().ontology_path_list)
+    if not {'generate_candidate', 'chunking'} & set(stages):
+        return counters
+
+    engine, it_hash, itid_tr, candidates = workload.with_candidates()
+    counters['triples_on_paths'] = len(itid_tr)
+    counters['transactions'] = len(set(itid_tr.values()))
+    counters['first_candidates'] = len(candidates) if candidates else 0
+    return counters
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    print(f"Against {baseline_file} (commit {baseline.get('commit')}):")
+    if baseline.get('parameters') != results['parameters']:
+        print("  Note: the workload parameters differ, timings are not directly comparable")
+    for stage, timing in results['stages'].items():
+        before = baseline['stages'].get(stage)
+        if before:
+            print(f"  {stage:<20} {before['min'] * 1000:9.2f}ms -> {timing['min'] * 1000:9.2f}ms "
+                  f"({timing['min'] / before['min']:.2f}x)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the FSM engine stages on synthetic data.")
+    parser.add_argument('--events', type=int, default=50, help="Watching events of the synthetic user.")
+    parser.add_argument('--movies', type=int, default=200, help="Movies the events are drawn from.")
+    parser.add_argument('--fanout', type=int, default=3, help="Child classes per schema class below Movie.")
+    parser.add_argument('--depth', type=int, default=2, help="Schema levels below Movie.")
+    parser.add_argument('--cross-links', type=int, default=0, help="Extra properties between inner classes.")
+    parser.add_argument('--values', type=int, default=2, help="Linked instances per instance and property.")
+    parser.add_argument('--pool', type=int, default=20, help="Distinct instances per class.")
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH, help="find_ontology_paths depth limit.")
+    parser.add_argument('--backend', choices=FSMEngine.BACKENDS, default=TRIPLE_BACKEND)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--output', default=None, help="Write the results to this JSON file.")
+    parser.add_argument('--compare', default=None, help="Print the change against an earlier JSON result.")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    workload = Workload(args)
+    runs = stage_runs(workload)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'parameters': vars(args) | {'output': None, 'compare': None},
+        'workload': workload_counters(workload, args.stages),
+        'stages': {},
+    }
+    print(f"Workload: {results['workload']}")
+    for stage in args.stages:
+        setup, run = runs[stage]
+        results['stages'][stage] = measure(setup, run, args.repeat)
+        print(f"  {stage:<20} min {results['stages'][stage]['min'] * 1000:9.2f}ms  "
+              f"median {results['stages'][stage]['median'] * 1000:9.2f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import random
+from collections import deque
+
+# Classes every synthetic schema shares with the MovieLens one: a user's watching events
+# point at a movie and a rating; everything below Movie is generated.
+CORE_SCHEMA = [
+    ('User', 'UserWatching', 'WatchingEvent'),
+    ('WatchingEvent', 'WatchingMovie', 'Movie'),
+    ('WatchingEvent', 'hasRating', 'Rating'),
+]
+
+
+class SyntheticSchema:
+    """
+    Ontology below Movie shaped as a tree: every class at depth < depth has fanout
+    child classes, the leaves are end classes. cross_links extra properties join
+    random inner classes, which multiplies the schema-level paths.
+    """
+
+    def __init__(self, fanout=3, depth=2, cross_links=0, seed=0):
+        rng = random.Random(seed)
+        self.properties = list(CORE_SCHEMA)
+        self.children = {}  # class -> [(property, child class)]
+
+        level = ['Movie']
+        inner = []
+        for d in range(1, depth + 1):
+            next_level = []
+            for parent in level:
+                for _ in range(fanout):
+                    child = f'C{d}_{len(next_level)}'
+                    self.add_property(parent, f'has{child}', child)
+                    next_level.append(child)
+            inner.extend(level)
+            level = next_level
+        self.end_classes = ['User', 'Rating'] + level
+
+        for n in range(cross_links):
+            if len(inner) < 2:
+                break
+            dom, ran = rng.sample(inner, 2)
+            self.add_property(dom, f'link{n}', ran)
+
+    def add_property(self, dom, prop, ran):
+        self.properties.append((dom, prop, ran))
+        self.children.setdefault(dom, []).append((prop, ran))
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for i, (dom, prop, ran) in enumerate(self.properties):
+                f.write(f'P{i}^{dom}^{prop}^{ran}\n')
+
+
+def user_triples(schema, events=50, movies=200, values=2, pool=20, seed=0):
+    """
+    Triple rows [triple_id, subj_cl, subj_inst, prop, obj_cl, obj_inst] (strings, as
+    store_triples takes them) for one user watching events distinct movies, plus the
+    metadata reachable from those movies. Each instance links to values instances of
+    every child class, drawn from pool instances per class; the same instance always
+    gets the same links, so smaller pools mean more shared (frequent) structure.
+    """
+    rng = random.Random(seed)
+    watched = rng.sample(range(movies), min(events, movies))
+
+    rows = []
+    seen = set()
+
+    def add(subj_cl, subj_inst, prop, obj_cl, obj_inst):
+        key = (subj_inst, prop, obj_inst)
+        if key not in seen:
+            seen.add(key)
+            rows.append([str(len(rows)), subj_cl, subj_inst, prop, obj_cl, obj_inst])
+
+    queue = deque()
+    for m in watched:
+        event = f'U1_M{m}'
+        movie = f'MOVI_{m}'
+        add('User', 'USER_1', 'UserWatching', 'WatchingEvent', event)
+        add('WatchingEvent', event, 'WatchingMovie', 'Movie', movie)
+        add('WatchingEvent', event, 'hasRating', 'Rating', f'RATE_{rng.randint(1, 5)}')
+        queue.append(('Movie', movie))
+
+    expanded = set()
+    while queue:
+        cl, inst = queue.popleft()
+        if inst in expanded:
+            continue
+        expanded.add(inst)
+        for prop, child in schema.children.get(cl, ()):
+            links = random.Random(f'{seed}:{prop}:{inst}')
+            for k in links.sample(range(pool), min(values, pool)):
+                child_inst = f'{child}_{k}'
+                add(cl, inst, prop, child, child_inst)
+                queue.append((child, child_inst))
+    return rows
@@ -0,0 +1,15 @@
+import tempfile
+import pytest
+from benchmarks.run_benchmarks import Workload
+
+# Synthetic user small enough for the test suite that still chunks several levels deep
+SYNTHETIC_USER = {'fanout': 3, 'depth': 2, 'cross_links': 0, 'values': 2, 'pool': 8, 'events': 60, 'movies': 40,
+                  'seed': 1, 'max_depth': 10, 'backend': 'object'}
+
+
+@pytest.fixture
+def synthetic_user(tmp_path):
+    """Builds Workloads of SYNTHETIC_USER with some parameters changed, their files under tmp_path."""
+    def make(**params):
+        return Workload.from_params(tempfile.mkdtemp(dir=tmp_path), **{**SYNTHETIC_USER, **params})
+    return make
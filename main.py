@@ -1,5 +1,37 @@
+import argparse
 from src.pipeline import run_pipeline
+from src.data_loader import load_mapped_data
+from src.movie_index import build_index
+from src.compiled_schema import compile_schema
+from src.executors import EXECUTORS, parse_shard
+from src.manifest import merge_shard_manifests
+from src.config import EXECUTOR, THRESHOLDS
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Frequent Subgraph Mining on MovieLens users.")
+    parser.add_argument('--max-users', type=int, default=None, help="Only process users with ID up to this value.")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the run manifest and process every user.")
+    parser.add_argument('--only-changed', action='store_true',
+                        help="Re-mine only users whose ratings changed since the last manifest.")
+    parser.add_argument('--build-index', action='store_true',
+                        help="Build the ratings cache, the vocabulary, the movie metadata index and the compiled schema, then exit.")
+    parser.add_argument('--executor', choices=EXECUTORS, default=EXECUTOR, help="How users are mined in parallel.")
+    parser.add_argument('--jobs', type=int, default=None, help="Workers for the thread/process executors.")
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="Mine only shard i of N ('i/N'): users with user_id %% N == i.")
+    parser.add_argument('--thresholds', type=int, nargs='+', default=THRESHOLDS,
+                        help="Mine every user at these min_support values in one pass (results are tagged by threshold).")
+    parser.add_argument('--merge-shards', action='store_true',
+                        help="Merge the shard manifests into the main manifest, then exit.")
+    args = parser.parse_args()
 
+    if args.build_index:
+        load_mapped_data()
+        mapper = build_index()
+        compile_schema(mapper)
+    elif args.merge_shards:
+        shard_count, user_count = merge_shard_manifests()
+        print(f"Merged {shard_count} shard manifests ({user_count} users)")
+    else:
+        run_pipeline(max_users=args.max_users, resume=not args.no_resume, only_changed=args.only_changed,
+                     executor=args.executor, n_jobs=args.jobs, shard=args.shard, thresholds=args.thresholds)
@@ -0,0 +1,165 @@
+from collections import Counter, defaultdict
+
+
+class IsoClass:
+    __slots__ = ['members', 'tr_counts', 'depth']
+
+    def __init__(self, depth):
+        self.members = {}           # tid -> None (ordered set)
+        self.tr_counts = Counter()  # transaction -> number of members in it
+        self.depth = depth          # same for every member: it only depends on the code
+
+
+class IsoClassIndex:
+    """
+    Isomorphism classes of the triples being mined, kept up to date across chunking
+    levels instead of being rebuilt by every generate_candidate call.
+
+    Chunking reports the triples it consumes (remove) and relabels (update); only those
+    are re-hashed. Class sizes and distinct-transaction counts are maintained with the
+    classes, so select() finds max_freq and the min-depth frontier from the classes at
+    the maximum frequency, and only rewrites the ITID_Freq_depth entries that changed.
+    Selection order, labels and ITID_Freq_depth values match a full recount.
+    """
+
+    def __init__(self, engine, it_hash, itid_tr):
+        self.engine = engine
+        self.it_hash = it_hash  # live working triples, read on update
+        self.itid_tr = itid_tr
+
+        self.position = {}      # tid -> insertion order, the order of a full recount
+        self.entry = {}         # tid -> (code, transaction, subj_inst, obj_inst) as indexed
+        self.classes = {}       # code -> IsoClass
+        self.size_count = Counter()
+        self.max_size = 0
+        self.by_distinct = defaultdict(set)  # distinct transactions -> codes
+        self.inst_tids = defaultdict(set)    # raw subj/obj instance -> tids
+
+        self.dirty = set()      # tids whose ITID_Freq_depth entry is stale
+        self.marked = set()     # tids flagged as candidates that are still being mined
+        self.full_write = True
+
+        for pos, (tid, triple) in enumerate(it_hash.items()):
+            self.position[tid] = pos
+            self._add(tid, triple)
+
+    def _add(self, tid, triple):
+        code = self.engine.iso_code(triple)
+        tr = self.itid_tr[tid]
+        self.entry[tid] = (code, tr, triple.subj_inst, triple.obj_inst)
+        self.inst_tids[triple.subj_inst].add(tid)
+        self.inst_tids[triple.obj_inst].add(tid)
+
+        iso_class = self.classes.get(code)
+        if iso_class is None:
+            iso_class = IsoClass(max(self.engine.inst_depth(code[1]), self.engine.inst_depth(code[4])))
+            self.classes[code] = iso_class
+        else:
+            self.size_count[len(iso_class.members)] -= 1
+            self.by_distinct[len(iso_class.tr_counts)].discard(code)
+
+        old_distinct = len(iso_class.tr_counts)
+        iso_class.members[tid] = None
+        iso_class.tr_counts[tr] += 1
+
+        size = len(iso_class.members)
+        self.size_count[size] += 1
+        if size > self.max_size:
+            self.max_size = size
+        self.by_distinct[len(iso_class.tr_counts)].add(code)
+
+        if len(iso_class.tr_counts) != old_distinct:
+            self.dirty.update(iso_class.members)
+        else:
+            self.dirty.add(tid)
+
+    def _discard(self, tid):
+        code, tr, subj_inst, obj_inst = self.entry.pop(tid)
+        self.inst_tids[subj_inst].discard(tid)
+        self.inst_tids[obj_inst].discard(tid)
+
+        iso_class = self.classes[code]
+        self.size_count[len(iso_class.members)] -= 1
+        self.by_distinct[len(iso_class.tr_counts)].discard(code)
+
+        old_distinct = len(iso_class.tr_counts)
+        del iso_class.members[tid]
+        iso_class.tr_counts[tr] -= 1
+        if iso_class.tr_counts[tr] == 0:
+            del iso_class.tr_counts[tr]
+
+        if iso_class.members:
+            self.size_count[len(iso_class.members)] += 1
+            self.by_distinct[len(iso_class.tr_counts)].add(code)
+            if len(iso_class.tr_counts) != old_distinct:
+                self.dirty.update(iso_class.members)
+        else:
+            del self.classes[code]
+
+        while self.max_size and self.size_count[self.max_size] == 0:
+            self.max_size -= 1
+
+        self.dirty.discard(tid)
+        self.marked.discard(tid)
+
+    def remove(self, tid):
+        """A triple left the working set (it was chunked)."""
+        self._discard(tid)
+        del self.position[tid]
+
+    def update(self, tid):
+        """A triple was relabeled (or the labels of its instances changed): re-hash it."""
+        self._discard(tid)
+        self._add(tid, self.it_hash[tid])
+
+    def ordered_members(self, iso_class):
+        return sorted(iso_class.members, key=self.position.__getitem__)
+
+    def select(self, threshold):
+        """generate_candidate over the current classes. Returns (candi_it_tr, same_itids)."""
+        engine = self.engine
+        ITID_Freq_depth = engine.ITID_Freq_depth
+
+        if not self.classes:
+            return {}, {}
+
+        if self.full_write:
+            # First selection: write every entry, class by class in order of first occurrence
+            ordered = sorted((self.ordered_members(iso_class) for iso_class in self.classes.values()),
+                             key=lambda members: self.position[members[0]])
+            for members in ordered:
+                iso_class = self.classes[self.entry[members[0]][0]]
+                for tid in members:
+                    ITID_Freq_depth[tid] = [len(iso_class.tr_counts), '0', iso_class.depth, '0']
+            self.full_write = False
+        else:
+            for tid in self.dirty | self.marked:
+                iso_class = self.classes[self.entry[tid][0]]
+                ITID_Freq_depth[tid] = [len(iso_class.tr_counts), '0', iso_class.depth, '0']
+        self.dirty.clear()
+        self.marked.clear()
+
+        # A class reaches max_freq distinct transactions only if it also has max_freq members
+        max_freq = self.max_size
+        frontier = [self.classes[code] for code in self.by_distinct.get(max_freq, ())]
+        min_depth = min([iso_class.depth for iso_class in frontier], default=0)
+
+        candi_it_tr = dict()
+        same_itids = dict()
+
+        if max_freq >= threshold:
+            chosen = sorted((self.ordered_members(iso_class) for iso_class in frontier if iso_class.depth == min_depth),
+                            key=lambda members: self.position[members[0]])
+            for members in chosen:
+                for tid in members:
+                    candi_it_tr[tid] = self.itid_tr[tid]
+                    ITID_Freq_depth[tid] = [max_freq, '1', min_depth, None]
+                    same_itids[tid] = set(members)
+                    self.marked.add(tid)
+
+        # Triples whose instances just got a chunk label hash differently from now on
+        for new_IID in engine.label_candidates(same_itids):
+            for tid in list(self.inst_tids.get(new_IID, ())):
+                self.update(tid)
+
+        return candi_it_tr, same_itids
@@ -0,0 +1,79 @@
+import numpy as np
+
+COLUMNS = ('idx', 'subj_cl', 'subj_inst', 'prop', 'obj_cl', 'obj_inst', 'same_code', 'tr')
+
+
+class TripleColumns:
+    """
+    Array-backed alternative to {tid: Triple}: one int64 column per Triple field
+    plus the transaction (start instance) of each triple. Row order follows the
+    insertion order of the dict it was built from.
+    """
+    __slots__ = COLUMNS
+
+    def __init__(self, idx, subj_cl, subj_inst, prop, obj_cl, obj_inst, same_code, tr):
+        self.idx = idx
+        self.subj_cl = subj_cl
+        self.subj_inst = subj_inst
+        self.prop = prop
+        self.obj_cl = obj_cl
+        self.obj_inst = obj_inst
+        self.same_code = same_code
+        self.tr = tr
+
+    @classmethod
+    def from_triples(cls, triple_dict, itid_tr):
+        triples = list(triple_dict.values())
+        n = len(triples)
+
+        def column(values):
+            return np.fromiter(values, dtype=np.int64, count=n)
+
+        return cls(column(t.idx for t in triples),
+                   column(t.subj_cl for t in triples),
+                   column(t.subj_inst for t in triples),
+                   column(t.prop for t in triples),
+                   column(t.obj_cl for t in triples),
+                   column(t.obj_inst for t in triples),
+                   column(t.same_code for t in triples),
+                   column(itid_tr[t.idx] for t in triples))
+
+    def __len__(self):
+        return len(self.idx)
+
+    def copy(self):
+        return TripleColumns(*(getattr(self, name).copy() for name in COLUMNS))
+
+    def take(self, rows):
+        """New TripleColumns with only the given rows (index array or boolean mask), order kept."""
+        return TripleColumns(*(getattr(self, name)[rows] for name in COLUMNS))
+
+    def row_of(self):
+        """{tid: row}"""
+        return {tid: row for row, tid in enumerate(self.idx.tolist())}
+
+    def rows_by_tr(self):
+        """{transaction: rows in insertion order}"""
+        order = np.argsort(self.tr, kind='stable')
+        trs, starts = np.unique(self.tr[order], return_index=True)
+        return {tr: rows for tr, rows in zip(trs.tolist(), np.split(order, starts[1:]))}
+
+
+def lookup(keys, values, query):
+    """
+    Vectorized dict lookup: returns (hit mask, mapped values for the hits).
+    keys must be sorted; values aligned with keys.
+    """
+    if len(keys) == 0:
+        return np.zeros(len(query), dtype=bool), values[:0]
+    pos = np.searchsorted(keys, query)
+    pos[pos == len(keys)] = 0
+    hit = keys[pos] == query
+    return hit, values[pos[hit]]
+
+
+def sorted_mapping(mapping):
+    keys = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+    values = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+    order = np.argsort(keys)
+    return keys[order], values[order]
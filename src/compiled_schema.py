@@ -0,0 +1,83 @@
+import os
+import pickle
+from .config import COMPILED_SCHEMA_FILE, SCHEMA_FILE, START_CLASS, END_CLASS_LIST, OPTION_CLASS_LIST, MAX_DEPTH
+from .fsm import FSMEngine
+from .utils import content_fingerprint
+
+# Pickled dict: format version, key, the load_schema outputs, the ontology paths and the
+# IDs the mapper gave every schema term. Only used when the key matches and the current
+# vocabulary still gives those terms the same IDs.
+SCHEMA_FORMAT_VERSION = 1
+
+
+def schema_fingerprint(schema_file=SCHEMA_FILE):
+    return content_fingerprint([schema_file], SCHEMA_FORMAT_VERSION, START_CLASS, END_CLASS_LIST, MAX_DEPTH)
+
+
+def schema_terms(schema_file=SCHEMA_FILE):
+    """Every term load_schema and find_ontology_paths give an ID to."""
+    terms = []
+    with open(schema_file, 'r') as f:
+        while True:
+            line = f.readline().rstrip()
+            if not line:
+                break
+            terms.extend(line.split('^'))
+    return terms + [START_CLASS] + END_CLASS_LIST + OPTION_CLASS_LIST
+
+
+def compile_schema(mapper, schema_file=SCHEMA_FILE, path=COMPILED_SCHEMA_FILE):
+    """Parses the schema, enumerates its paths and saves both. Returns the compiled schema."""
+    engine = FSMEngine(mapper)
+    property_dict, ontology_graph, class_dict = engine.load_schema(schema_file)
+    ontology_path_list, path_property_set = engine.find_ontology_paths(
+        START_CLASS, END_CLASS_LIST, ontology_graph, MAX_DEPTH
+    )
+
+    compiled = {
+        'version': SCHEMA_FORMAT_VERSION,
+        'key': schema_fingerprint(schema_file),
+        'term_ids': {term: mapper.get_id(term) for term in schema_terms(schema_file)},
+        'property_dict': property_dict,
+        'ontology_graph': ontology_graph,
+        'class_dict': class_dict,
+        'ontology_path_list': ontology_path_list,
+        'path_property_set': path_property_set,
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return compiled
+
+
+def load_compiled_schema(mapper, schema_file=SCHEMA_FILE, path=COMPILED_SCHEMA_FILE):
+    """The saved compiled schema, or None if it is missing, stale or numbered by another vocabulary."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            compiled = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    if compiled.get('version') != SCHEMA_FORMAT_VERSION or compiled.get('key') != schema_fingerprint(schema_file):
+        return None
+    str_to_int = mapper.str_to_int
+    if any(str_to_int.get(term) != term_id for term, term_id in compiled['term_ids'].items()):
+        return None
+    return compiled
+
+
+def load_or_compile_schema(mapper, schema_file=SCHEMA_FILE, path=COMPILED_SCHEMA_FILE):
+    compiled = load_compiled_schema(mapper, schema_file, path)
+    if compiled is not None:
+        print(f"Loaded compiled schema ({len(compiled['ontology_path_list'])} paths) from {path}")
+        return compiled
+
+    print("Compiling schema...")
+    compiled = compile_schema(mapper, schema_file, path)
+    print(f"Saved compiled schema ({len(compiled['ontology_path_list'])} paths) to {path}")
+    return compiled
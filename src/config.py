@@ -13,7 +13,15 @@ SUBGRAPHS_FOLDER = os.path.join(ROOT_DIR, 'subgraphs')
 # Files
 RATINGS_FILE = os.path.join(DATA_DIR, 'ratings.dat')
 LINKS_FILE = os.path.join(INPUT_DIR, 'links.csv')
-MAPPED_DATA_FILE = os.path.join(INPUT_DIR, 'mapped_ml_1m.pkl')
+MAPPED_DATA_DIR = os.path.join(INPUT_DIR, 'mapped_ml_1m')  # One .npy per column plus a per-user offset index
+VOCAB_FILE = os.path.join(INPUT_DIR, 'vocab.bin')
+MOVIE_INDEX_DIR = os.path.join(INPUT_DIR, 'movie_index')  # Encoded metadata triples per movie
+COMPILED_SCHEMA_FILE = os.path.join(INPUT_DIR, 'schema_compiled.pkl')  # Parsed schema and its paths
+MANIFEST_FILE = os.path.join(SUBGRAPHS_FOLDER, 'manifest.jsonl')
+RESULTS_DIR = os.path.join(SUBGRAPHS_FOLDER, 'results')
+RUN_SUMMARY_FILE = os.path.join(SUBGRAPHS_FOLDER, 'run_summary.json')  # Stage timings and counters of the last run
+USER_METRICS_FILE = os.path.join(SUBGRAPHS_FOLDER, 'user_metrics.jsonl')  # The same per user
+PROFILE_DIR = os.path.join(SUBGRAPHS_FOLDER, 'profiles')
 
 # Hyperparameters
 RECENT = 100  # Number of movies to use for learning
@@ -22,4 +30,25 @@ END_CLASS_LIST = ['User', 'Rating', 'Collection', 'Genre', 'Company', 'Country',
                   'Budget', 'Popularity', 'Revenue', 'Runtime', 'Vote_Average', 'Vote_Count']
 OPTION_CLASS_LIST = ['Movie']  # Classes to be abstracted
 MAX_DEPTH = 10
+TRIPLE_BACKEND = 'object'  # 'object' (Triple per triple) or 'columnar' (NumPy arrays)
+RESULT_BATCH_USERS = 16  # Users per worker task; each task writes one part file per result table
+IN_FLIGHT_PER_WORKER = 2  # Batches submitted ahead per worker; the user scan waits beyond that
+EXECUTOR = 'process'  # 'serial', 'thread' or 'process'
+N_JOBS = None  # Workers for the thread/process executors; None = all cores but one
+THRESHOLDS = None  # min_support values mined together per user (a sweep); None = from the user's event count
+SUFFIX_CACHE_MOVIES = 2000  # Movies whose path suffixes each worker keeps (LRU); 0 turns the cache off
 
+# Profiling (environment: FSM_PROFILE, FSM_PROFILE_USERS, FSM_PROFILE_SLOWEST)
+PROFILE_MODE = None  # None (off), 'cprofile' or 'sampling'
+PROFILE_USERS = []  # User IDs to profile
+PROFILE_SLOWEST = 0  # Also profile the N users with the highest estimated cost
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples in 'sampling' mode
+
+
+# Diagnostics
+LOG_FILE = 'fsm_run.log'
+# Per-channel thresholds. Per-user dumps are emitted at DEBUG, so they are off
+# (and never built) unless their channel is lowered to 'DEBUG'.
+LOG_CHANNEL_LEVELS = {'schema': 'INFO', 'triples': 'INFO', 'paths': 'INFO', 'chunking': 'INFO'}
+LOG_MODE = 'full'  # 'full' dumps whole structures, 'summary' writes sizes and a bounded sample
+LOG_SAMPLE_SIZE = 5
@@ -1,73 +1,175 @@
+import numpy as np
 import pandas as pd
 import pickle
 import os
+import json
 from collections import defaultdict
 from .config import (
-    RATINGS_FILE, LINKS_FILE, MAPPED_DATA_FILE, METADATA_PICKLE_DIR, INPUT_DIR
+    RATINGS_FILE, LINKS_FILE, MAPPED_DATA_DIR, METADATA_PICKLE_DIR, INPUT_DIR
 )
+from .utils import fingerprint
+
+METADATA_FILES = [
+    'collection_triples.pkl', 'genre_triples.pkl', 'company_triples.pkl',
+    'country_triples.pkl', 'budget_triples.pkl', 'popularity_triples.pkl',
+    'revenue_triples.pkl', 'runtime_triples.pkl', 'voav_triples.pkl',
+    'voco_triples.pkl', 'cast_triples.pkl', 'crew_triples.pkl',
+    'keyword_triples.pkl'
+]
+
+RATINGS_CHUNK_ROWS = 1_000_000
+MAPPED_COLUMNS = ['userId', 'tmdbId', 'rating', 'timestamp']
+MAPPED_FORMAT_VERSION = 1
+
+_opened = {}  # directory -> MappedRatings, per process
+
+def metadata_paths():
+    return [os.path.join(METADATA_PICKLE_DIR, filename) for filename in METADATA_FILES]
+
+def read_links(path=LINKS_FILE):
+    """
+    movieId -> tmdbId as a lookup array indexed by movieId (-1 where there is no tmdbId).
+    """
+    links = pd.read_csv(path, usecols=['movieId', 'tmdbId'], dtype={'movieId': 'int64', 'tmdbId': 'float64'})
+    links = links[links['tmdbId'].notnull()]
+
+    movie_ids = links['movieId'].to_numpy()
+    tmdb_by_movie = np.full(int(movie_ids.max()) + 1 if len(movie_ids) else 0, -1, dtype=np.int64)
+    tmdb_by_movie[movie_ids] = links['tmdbId'].to_numpy().astype(np.int64)
+    return tmdb_by_movie
+
+def read_ratings(tmdb_by_movie, path=RATINGS_FILE, chunk_rows=RATINGS_CHUNK_ROWS):
+    """
+    Reads '::'-separated ratings with the C parser, chunk by chunk, joining movieId to tmdbId
+    on the way. Splitting on ':' leaves an empty field between the real ones, which is skipped.
+    Only the typed columns of rated movies with a tmdbId are kept, in file order.
+    """
+    reader = pd.read_csv(
+        path, sep=':', header=None, engine='c', chunksize=chunk_rows,
+        names=['userId', '_', 'movieId', '__', 'rating', '___', 'timestamp'],
+        usecols=['userId', 'movieId', 'rating', 'timestamp'],
+        dtype={'userId': 'int32', 'movieId': 'int64', 'timestamp': 'int64'}
+    )
+
+    columns = {'userId': [], 'tmdbId': [], 'rating': [], 'timestamp': []}
+    for chunk in reader:
+        movie_ids = chunk['movieId'].to_numpy()
+        known = movie_ids < len(tmdb_by_movie)
+        tmdb_ids = np.full(len(movie_ids), -1, dtype=np.int64)
+        tmdb_ids[known] = tmdb_by_movie[movie_ids[known]]
+        keep = tmdb_ids >= 0
+
+        columns['userId'].append(chunk['userId'].to_numpy()[keep])
+        columns['tmdbId'].append(tmdb_ids[keep])
+        columns['rating'].append(chunk['rating'].to_numpy()[keep])
+        columns['timestamp'].append(chunk['timestamp'].to_numpy()[keep])
+
+    return pd.DataFrame({name: np.concatenate(parts) for name, parts in columns.items()})
 
 def load_and_preprocess_data():
     """
-    Loads ratings and links, merges them, handles nulls, and saves/returns the mapped dataframe.
+    Loads ratings and links, merges them, handles nulls, and returns the mapped dataframe.
     """
     # Ensure input directory exists
     if not os.path.exists(INPUT_DIR):
         os.makedirs(INPUT_DIR)
 
-    # 1. Load Ratings
+    # 1. Load Links
+    print("Loading links...")
+    tmdb_by_movie = read_links()
+
+    # 2. Load Ratings, merged with links and without null tmdbId
     print("Loading ratings...")
-    ml_1m = pd.read_csv(RATINGS_FILE, sep='::', engine='python', header=None)
-    ml_1m.columns = ['userId', 'movieId', 'rating', 'timestamp']
+    ml_1m_merged = read_ratings(tmdb_by_movie)
 
-    # 2. Load Links
-    print("Loading links...")
-    links = pd.read_csv(LINKS_FILE)
+    # 3. Sort (stable, so ratings with equal timestamps keep their file order)
+    order = np.lexsort((ml_1m_merged['timestamp'].to_numpy(), ml_1m_merged['userId'].to_numpy()))
+    mapped_ml_1m = ml_1m_merged.take(order).reset_index(drop=True)
 
-    # 3. Merge
-    print("Merging data...")
-    ml_1m_merged = pd.merge(ml_1m, links, left_on='movieId', right_on='movieId', sort=False)
+    return mapped_ml_1m
 
-    # 4. Filter Null tmdbId
-    ml_1m_merged = ml_1m_merged.loc[:, ['userId', 'tmdbId', 'rating', 'timestamp']].copy()
-    ml_1m_merged = ml_1m_merged[ml_1m_merged['tmdbId'].notnull()].copy()
-    
-    # 5. Type Conversion
-    ml_1m_merged['tmdbId'] = ml_1m_merged['tmdbId'].astype(int)
+class MappedRatings:
+    """
+    The preprocessed ratings as memory-mapped columns (sorted by user, then timestamp)
+    with a per-user offset index: user i owns rows offsets[i]:offsets[i + 1].
+    """
 
-    # 6. Sort
-    mapped_ml_1m = ml_1m_merged.sort_values(['userId', 'timestamp'])
+    def __init__(self, directory):
+        self.directory = directory
+        self.columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                        for name in MAPPED_COLUMNS}
+        self.user_ids = np.load(os.path.join(directory, 'users.npy'))
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
 
-    # 7. Save
-    print(f"Saving mapped data to {MAPPED_DATA_FILE}...")
-    with open(MAPPED_DATA_FILE, 'wb') as f:
-        pickle.dump(mapped_ml_1m, f)
+    def __len__(self):
+        return len(self.user_ids)
 
-    return mapped_ml_1m
+    def user_slices(self):
+        """(user_id, start, end) per user, in user order."""
+        for user_id, start, end in zip(self.user_ids.tolist(), self.offsets[:-1].tolist(), self.offsets[1:].tolist()):
+            yield user_id, start, end
+
+    def user_frame(self, start, end):
+        """One user's rows, copied out of the mapped columns."""
+        return pd.DataFrame({name: np.array(column[start:end]) for name, column in self.columns.items()})
+
+def mapped_data_fingerprint():
+    return fingerprint([RATINGS_FILE, LINKS_FILE], MAPPED_FORMAT_VERSION)
+
+def save_mapped_data(mapped_ml_1m, source_key, directory=MAPPED_DATA_DIR):
+    os.makedirs(directory, exist_ok=True)
+    source_file = os.path.join(directory, 'source.json')
+    if os.path.exists(source_file):
+        os.remove(source_file)
 
-def load_mapped_data():
-    if os.path.exists(MAPPED_DATA_FILE):
-        print(f"Loading mapped data from {MAPPED_DATA_FILE}...")
-        with open(MAPPED_DATA_FILE, 'rb') as f:
-            return pickle.load(f)
+    for name in MAPPED_COLUMNS:
+        np.save(os.path.join(directory, f'{name}.npy'), mapped_ml_1m[name].to_numpy())
+
+    user_column = mapped_ml_1m['userId'].to_numpy()
+    user_ids, starts = np.unique(user_column, return_index=True)
+    np.save(os.path.join(directory, 'users.npy'), user_ids)
+    np.save(os.path.join(directory, 'offsets.npy'), np.append(starts, len(user_column)).astype(np.int64))
+
+    # Written last: the cache is only valid once the source key is there
+    with open(source_file, 'w') as f:
+        json.dump({'source': source_key}, f)
+
+def cached_source_key(directory=MAPPED_DATA_DIR):
+    try:
+        with open(os.path.join(directory, 'source.json'), 'r') as f:
+            return json.load(f)['source']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def open_mapped_data(directory=MAPPED_DATA_DIR):
+    """Maps the cache once per process (workers call this for every user)."""
+    if directory not in _opened:
+        _opened[directory] = MappedRatings(directory)
+    return _opened[directory]
+
+def load_mapped_data(directory=MAPPED_DATA_DIR):
+    """
+    Returns the preprocessed ratings as MappedRatings, rebuilding the cache
+    first if ratings.dat or links.csv changed since it was written.
+    """
+    source_key = mapped_data_fingerprint()
+    if cached_source_key(directory) == source_key:
+        print(f"Loading mapped data from {directory}...")
     else:
-        return load_and_preprocess_data()
+        mapped_ml_1m = load_and_preprocess_data()
+        print(f"Saving mapped data to {directory}...")
+        save_mapped_data(mapped_ml_1m, source_key, directory)
+        _opened.pop(directory, None)
+    return open_mapped_data(directory)
 
 def load_metadata_triples():
     """
     Loads all metadata triples from pickle files and returns a dictionary of dictionaries.
     """
     print("Loading metadata triples...")
-    metadata_files = [
-        'collection_triples.pkl', 'genre_triples.pkl', 'company_triples.pkl',
-        'country_triples.pkl', 'budget_triples.pkl', 'popularity_triples.pkl',
-        'revenue_triples.pkl', 'runtime_triples.pkl', 'voav_triples.pkl',
-        'voco_triples.pkl', 'cast_triples.pkl', 'crew_triples.pkl',
-        'keyword_triples.pkl'
-    ]
-    
     metadata_dicts = {}
     
-    for filename in metadata_files:
+    for filename in METADATA_FILES:
         key = filename.replace('.pkl', '') + '_dict'  # e.g., collection_triples_dict
         filepath = os.path.join(METADATA_PICKLE_DIR, filename)
         
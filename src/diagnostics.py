@@ -0,0 +1,92 @@
+import logging
+from itertools import islice
+from .config import LOG_CHANNEL_LEVELS, LOG_MODE, LOG_SAMPLE_SIZE
+
+ROOT_CHANNEL = 'fsm'
+
+_settings = {'mode': LOG_MODE, 'sample_size': LOG_SAMPLE_SIZE}
+_handler = None
+
+
+def get_channel(channel):
+    return logging.getLogger(f'{ROOT_CHANNEL}.{channel}')
+
+
+def set_channel_levels(channel_levels):
+    for channel, level in channel_levels.items():
+        get_channel(channel).setLevel(level)
+
+
+def setup(log_file, filemode='w', channel_levels=None, mode=None, sample_size=None):
+    """
+    Attaches the log file to the 'fsm' channel tree (once per process) and applies
+    channel levels and output mode. Workers call this with filemode='a'.
+    """
+    global _handler
+
+    root = logging.getLogger(ROOT_CHANNEL)
+    if _handler is None:
+        _handler = logging.FileHandler(log_file, mode=filemode)
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        root.addHandler(_handler)
+        root.setLevel(logging.INFO)
+        root.propagate = False
+
+    set_channel_levels(channel_levels if channel_levels is not None else LOG_CHANNEL_LEVELS)
+    if mode is not None:
+        _settings['mode'] = mode
+    if sample_size is not None:
+        _settings['sample_size'] = sample_size
+
+
+def enabled(channel, level=logging.INFO):
+    return get_channel(channel).isEnabledFor(level)
+
+
+def summarize(data, sample_size):
+    """Size, nested item count and a bounded sample instead of the whole structure."""
+    if isinstance(data, dict):
+        sample = list(islice(data.items(), sample_size))
+        values = data.values()
+    elif isinstance(data, (list, tuple, set, frozenset)):
+        sample = list(islice(data, sample_size))
+        values = data
+    else:
+        return str(data)
+
+    summary = f'<{type(data).__name__} len={len(data)}'
+    if values and all(isinstance(v, (dict, list, tuple, set, frozenset)) for v in values):
+        summary += f' nested_len={sum(len(v) for v in values)}'
+    return summary + f' sample={sample}>'
+
+
+def log(channel, message, level=logging.INFO):
+    """Logs a line on a channel. A callable message is only evaluated when the channel is enabled."""
+    logger = get_channel(channel)
+    if not logger.isEnabledFor(level):
+        return
+    if callable(message):
+        message = message()
+    logger.log(level, message)
+
+
+def log_data(var_name, data, channel='general', level=logging.INFO):
+    """
+    Logs a named structure on a channel. Nothing is formatted unless the channel is
+    enabled; a callable is evaluated lazily. In 'summary' mode only sizes and a
+    bounded sample are written.
+    """
+    logger = get_channel(channel)
+    if not logger.isEnabledFor(level):
+        return
+    if callable(data):
+        data = data()
+
+    logger.log(level, var_name)
+    if _settings['mode'] == 'summary':
+        logger.log(level, summarize(data, _settings['sample_size']))
+    else:
+        logger.log(level, str(data))
+
+
+set_channel_levels(LOG_CHANNEL_LEVELS)
@@ -0,0 +1,56 @@
+import argparse
+import os
+from joblib import Parallel, delayed, cpu_count
+
+# serial: in the calling process, one batch after another (profiling, debugging)
+# thread: worker threads in the calling process
+# process: worker processes (loky)
+EXECUTORS = ('serial', 'thread', 'process')
+_JOBLIB_BACKENDS = {'thread': 'threading', 'process': 'loky'}
+
+
+def default_jobs():
+    return max(1, cpu_count() - 1)
+
+
+def run_tasks(executor, function, tasks, n_jobs, in_flight_per_worker, *args):
+    """
+    Runs function(task, *args) for every task and yields the results as tasks finish.
+    Tasks are drawn from the iterable lazily, at most in_flight_per_worker per worker ahead.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}', expected one of {EXECUTORS}")
+
+    if executor == 'serial':
+        for task in tasks:
+            yield function(task, *args)
+        return
+
+    yield from Parallel(n_jobs=n_jobs, backend=_JOBLIB_BACKENDS[executor],
+                        pre_dispatch=f'{in_flight_per_worker}*n_jobs', return_as='generator_unordered')(
+        delayed(function)(task, *args) for task in tasks
+    )
+
+
+def shard_path(path, shard):
+    """File of shard (i, N) next to path: name.shard-i-of-N.ext"""
+    index, count = shard
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard-{index}-of-{count}{ext}'
+
+
+def parse_shard(text):
+    """'i/N' -> (i, N) with 0 <= i < N. Errors are argparse's, so --shard reports them as usage errors."""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like 'i/N', got '{text}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in 0..N-1, got '{text}'")
+    return index, count
+
+
+def in_shard(user_ids, shard):
+    """Boolean mask of the users owned by shard (i, N): user_id % N == i, the same on every host."""
+    index, count = shard
+    return user_ids % count == index
@@ -1,24 +1,38 @@
-import copy
 import logging
-from collections import defaultdict
+import time
+import numpy as np
+from . import diagnostics
+from .candidates import IsoClassIndex
+from .columnar import TripleColumns, lookup, sorted_mapping
 from .utils import Triple, CustomError, log_data
-from .config import OPTION_CLASS_LIST
+from .config import OPTION_CLASS_LIST, TRIPLE_BACKEND
 
 class FSMEngine:
-    def __init__(self, mapper):
+    BACKENDS = ('object', 'columnar')
+
+    def __init__(self, mapper, backend=TRIPLE_BACKEND):
+        if backend not in self.BACKENDS:
+            raise CustomError(f"Unknown triple backend '{backend}'. Expected one of {self.BACKENDS}.")
         self.mapper = mapper
+        self.backend = backend
         self.ontology_path_list = []
         self.property_dict = {}
         self.prop_triples_dict = {}
+        self.triple_index = {}
         self.prop_chunk_type_dict = {}
         self.ChunkID_Label = {}
+        # Chunk nodes '_{depth}:{n}' live outside the mapper as negative IDs: (depth, n) <-> ID
+        self.chunk_ids = {}
+        self.chunk_keys = []
         self.ITID_Freq_depth = {}
         self.depth_chunk = 0
         self.Chunking_Result = {}
         self.chunking_result_final = {}
         self.chunk_stack = []
+        self.level_seconds = []  # wall time of each chunking level
         self.path_property_set = set()
         self.option_class_ids = set()
+        self.memoized_starts = 0  # start instances whose movie paths came from cached suffixes
 
     def load_schema(self, file):
         prop_dict = dict()
@@ -65,9 +79,9 @@ class FSMEngine:
         # Cache Option Class IDs
         self.option_class_ids = {self.mapper.get_id(c) for c in OPTION_CLASS_LIST}
 
-        log_data('property_dict', str(prop_dict)) # Log string rep
-        log_data('ontology_graph', str(ont_graph))
-        log_data('cl_dict', str(cl_dict))
+        log_data('property_dict', prop_dict, channel='schema')
+        log_data('ontology_graph', ont_graph, channel='schema')
+        log_data('cl_dict', cl_dict, channel='schema')
 
         return prop_dict, ont_graph, cl_dict
 
@@ -77,34 +91,96 @@ class FSMEngine:
         end_ids = {self.mapper.get_id(e) for e in end}
         
         properties = set()
-        stack = [(start_id, [], [start_id])]
         result = []
 
-        while stack:
-            n, path, cl = stack.pop()
-            if len(path) >= max_depth:
-                continue
-            if n in end_ids:
-                result.append(path)
-                for i in path:
-                    properties.add(i)
-            else:
-                if n in graph:
-                    for m in graph[n]:
-                        # m is [idx_id, ran_id/dom_id]
-                        if m[0] not in path:
-                            stack.append((m[1], path + [m[0]], cl + [m[1]]))
+        for path in self.iter_ontology_paths(start_id, end_ids, graph, max_depth):
+            result.append(path)
+            properties.update(path)
 
-        log_data('ontology_path_list', str(result))
-        log_data('Number of schema-level paths', len(result))
-        log_data('path_property_set', str(properties))
+        log_data('ontology_path_list', result, channel='schema')
+        log_data('Number of schema-level paths', len(result), channel='schema')
+        log_data('path_property_set', properties, channel='schema')
 
         return result, properties
 
+    def end_class_distances(self, end_ids, graph):
+        """Fewest hops from each class to an end class (BFS from the end classes); unreachable classes are left out."""
+        distance = {end_id: 0 for end_id in end_ids}
+        frontier = list(end_ids)
+        while frontier:
+            next_frontier = []
+            for cl in frontier:
+                for _, neighbour in graph.get(cl, ()):
+                    if neighbour not in distance:
+                        distance[neighbour] = distance[cl] + 1
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return distance
+
+    def iter_ontology_paths(self, start_id, end_ids, graph, max_depth):
+        """
+        Yields the property paths from start_id to an end class with fewer than max_depth
+        properties, none repeated, in depth-first order.
+
+        A branch is only followed if the end class distance of the class it leads to still
+        fits in the remaining depth; such a branch cannot yield a path, so the paths and
+        their order are those of the unpruned search. Properties used by a path are a bitmask
+        and the path itself is a linked list of (property, parent) until it is yielded.
+        """
+        distance = self.end_class_distances(end_ids, graph)
+        limit = max_depth - 1  # longest path recorded
+        bit = {}
+
+        if distance.get(start_id, limit + 1) > limit:
+            return
+
+        # Entries: (class, length, used property mask, linked path)
+        stack = [(start_id, 0, 0, None)]
+        while stack:
+            n, length, used, linked = stack.pop()
+            if n in end_ids:
+                path = []
+                while linked is not None:
+                    path.append(linked[0])
+                    linked = linked[1]
+                path.reverse()
+                yield path
+                continue
+
+            for property_id, next_cl in graph.get(n, ()):
+                if property_id not in bit:
+                    bit[property_id] = 1 << len(bit)
+                if used & bit[property_id]:
+                    continue
+                if length + 1 + distance.get(next_cl, limit + 1) > limit:
+                    continue
+                stack.append((next_cl, length + 1, used | bit[property_id], (property_id, linked)))
+
     def store_triples(self, triples_data, start_cl):
         """
         triples_data: list of raw strings/values. 
-        We convert them to IDs here.
+        We convert them to IDs here and store them with store_encoded_triples.
+        """
+        get_id = self.mapper.get_id
+        encoded_rows = [[get_id(row[0]), get_id(row[1]), get_id(row[2]), get_id(row[3]), get_id(row[4]), get_id(row[5])]
+                        for row in triples_data]
+        return self.store_encoded_triples(encoded_rows, start_cl)
+
+    @staticmethod
+    def index_keys(subj_cl, subj_inst, prop, obj_cl, obj_inst):
+        """triple_index keys of a triple, mirroring get_instance_of: a self-loop class maps to the (subj, obj) pair."""
+        if subj_cl == obj_cl:
+            return ((prop, subj_cl, (subj_inst, obj_inst)),)
+        return ((prop, subj_cl, subj_inst), (prop, obj_cl, obj_inst))
+
+    def store_encoded_triples(self, triples_data, start_cl):
+        """
+        triples_data: rows of integer IDs [triple_id, subj_cl, subj_inst, prop, obj_cl, obj_inst].
+
+        Besides the triple and property lookups, builds an adjacency index
+        keyed by (prop, cl, instance) where instance is what
+        Triple.get_instance_of(cl) returns, so path finding can fetch the
+        triples continuing a path directly instead of scanning the property.
         """
         start_cl_id = self.mapper.get_id(start_cl)
         
@@ -114,17 +190,9 @@ class FSMEngine:
         
         triple_dict = dict()
         prop_triples_dict = dict()
+        triple_index = dict()
 
-        for row in triples_data:
-            # row: [triple_id_str, subj_cl_str, subj_inst_str, prop_str, obj_cl_str, obj_inst_str]
-            # Convert ALL to IDs
-            triple_id = self.mapper.get_id(row[0])
-            subj_cl = self.mapper.get_id(row[1])
-            subj_inst = self.mapper.get_id(row[2])
-            prop = self.mapper.get_id(row[3])
-            obj_cl = self.mapper.get_id(row[4])
-            obj_inst = self.mapper.get_id(row[5])
-            
+        for triple_id, subj_cl, subj_inst, prop, obj_cl, obj_inst in triples_data:
             temp_triple = Triple(triple_id, subj_cl, subj_inst, prop, obj_cl, obj_inst)
 
             if obj_cl == start_cl_id and obj_inst not in start_instances_set:
@@ -141,26 +209,34 @@ class FSMEngine:
             else:
                 prop_triples_dict[prop].append(temp_triple)
 
-        log_data('start_instance_list', str(start_instances))
-        log_data('triple_dict', str(triple_dict))
-        log_data('prop_triples_dict', str(prop_triples_dict))
+            for key in self.index_keys(subj_cl, subj_inst, prop, obj_cl, obj_inst):
+                if key not in triple_index:
+                    triple_index[key] = [temp_triple]
+                else:
+                    triple_index[key].append(temp_triple)
+
+        log_data('start_instance_list', start_instances, channel='triples', level=logging.DEBUG)
+        log_data('triple_dict', triple_dict, channel='triples', level=logging.DEBUG)
+        log_data('prop_triples_dict', prop_triples_dict, channel='triples', level=logging.DEBUG)
 
-        return start_instances, triple_dict, prop_triples_dict
+        return start_instances, triple_dict, prop_triples_dict, triple_index
 
     def find_triple_paths(self, start_cl, start_instance):
         # start_cl and start_instance should be IDs
         start_cl_id = self.mapper.get_id(start_cl) if isinstance(start_cl, str) else start_cl
         
         # Logging with strings for debugging
-        logging.info('----------------- STARTING POINT: {a}, {b} -----------------'.format(
-            a=self.mapper.get_str(start_cl_id), 
-            b=self.mapper.get_str(start_instance)))
+        diagnostics.log('paths', lambda: '----------------- STARTING POINT: {a}, {b} -----------------'.format(
+            a=self.mapper.get_str(start_cl_id),
+            b=self.mapper.get_str(start_instance)), level=logging.DEBUG)
             
         triple_paths = []
         
         ontology_path_list = self.ontology_path_list
         property_dict = self.property_dict
         prop_triples_dict = self.prop_triples_dict
+        triple_index = self.triple_index
+        no_triples = ()
 
         for ont_path in ontology_path_list:
             # logging.info('ONT_PATH: %s' % ont_path) # ont_path contains IDs
@@ -170,14 +246,13 @@ class FSMEngine:
             first_subj_cl, first_prop, first_obj_cl = first_property
 
             if first_prop in prop_triples_dict:
-                for triple in prop_triples_dict[first_prop]:
-                    if first_subj_cl == start_cl_id:
-                        second_cl = first_obj_cl
-                    else:
-                        second_cl = first_subj_cl
+                if first_subj_cl == start_cl_id:
+                    second_cl = first_obj_cl
+                else:
+                    second_cl = first_subj_cl
 
-                    if start_instance == triple.get_instance_of(start_cl_id):
-                        queue.append((second_cl, triple.get_instance_of(second_cl), [triple.idx]))
+                for triple in triple_index.get((first_prop, start_cl_id, start_instance), no_triples):
+                    queue.append((second_cl, triple.get_instance_of(second_cl), [triple.idx]))
             else:
                 continue
 
@@ -188,17 +263,16 @@ class FSMEngine:
                 next_subj_cl, next_prop, next_obj_cl = next_property
 
                 if next_prop in prop_triples_dict:
-                    for j in range(len(queue)):
-                        first_cl, first_inst, path = queue.pop(0)
-
-                        for n_triple in prop_triples_dict[next_prop]:
-                            if next_subj_cl == first_cl:
-                                second_cl = next_obj_cl
-                            else:
-                                second_cl = next_subj_cl
-
-                            if first_inst == n_triple.get_instance_of(first_cl):
-                                queue.append((second_cl, n_triple.get_instance_of(second_cl), path + [n_triple.idx]))
+                    next_queue = []
+                    for first_cl, first_inst, path in queue:
+                        if next_subj_cl == first_cl:
+                            second_cl = next_obj_cl
+                        else:
+                            second_cl = next_subj_cl
+
+                        for n_triple in triple_index.get((next_prop, first_cl, first_inst), no_triples):
+                            next_queue.append((second_cl, n_triple.get_instance_of(second_cl), path + [n_triple.idx]))
+                    queue = next_queue
                 else:
                     queue = []
                     break
@@ -209,6 +283,147 @@ class FSMEngine:
 
         return triple_paths
 
+    @staticmethod
+    def build_path_trie(ontology_path_list, skip=()):
+        """
+        Arranges ontology paths into a prefix trie so shared hops are expanded once.
+        Each node maps property_id -> [children, indices of paths ending here].
+        Paths whose index is in skip are left out.
+        """
+        trie = {}
+        for path_no, ont_path in enumerate(ontology_path_list):
+            if path_no in skip:
+                continue
+            children = trie
+            node = None
+            for property_id in ont_path:
+                if property_id not in children:
+                    children[property_id] = [{}, []]
+                node = children[property_id]
+                children = node[0]
+            if node is not None:
+                node[1].append(path_no)
+        return trie
+
+    @staticmethod
+    def walk_path_trie(level, property_dict, triple_index, path_buckets, prop_triples_dict=None, lookups=None):
+        """
+        Expands level = [(trie children, class, frontier)] breadth first. Frontier entries are
+        (start_instance, current_instance, triple_path); a path reaching the end of ontology
+        path path_no is appended to path_buckets[start_instance][path_no].
+        Properties missing from prop_triples_dict are skipped without a lookup. With lookups
+        given, every triple_index key looked up is recorded with the number of triples found.
+        """
+        no_triples = ()
+        while level:
+            next_level = []
+            for children, cl, frontier in level:
+                for property_id, (grand_children, ending_paths) in children.items():
+                    subj_cl, prop, obj_cl = property_dict[property_id]
+                    if prop_triples_dict is not None and prop not in prop_triples_dict:
+                        continue
+
+                    if subj_cl == cl:
+                        second_cl = obj_cl
+                    else:
+                        second_cl = subj_cl
+
+                    next_frontier = []
+                    for start_instance, inst, path in frontier:
+                        triples = triple_index.get((prop, cl, inst), no_triples)
+                        if lookups is not None:
+                            lookups[(prop, cl, inst)] = len(triples)
+                        for triple in triples:
+                            next_frontier.append((start_instance, triple.get_instance_of(second_cl), path + [triple.idx]))
+
+                    if not next_frontier:
+                        continue
+
+                    for path_no in ending_paths:
+                        for start_instance, _, path in next_frontier:
+                            path_buckets[start_instance][path_no].append(path)
+
+                    if grand_children:
+                        next_level.append((grand_children, second_cl, next_frontier))
+            level = next_level
+
+    def movie_suffix_hops(self, start_cl_id, movie_suffixes):
+        """
+        Start instances whose paths past the hop to their movie can be taken from movie_suffixes
+        ({start_instance: (first_triple_id, MovieSuffixes)}). That holds when every such hop leads to
+        the one movie instance the suffixes were computed for, and this user's triple index finds
+        exactly the movie's own triples for every key the suffix walk looked up, so walking this
+        user's triples would find the same paths. Returns {start_instance: {path_no: hop triple ID}}.
+        """
+        property_dict = self.property_dict
+        triple_index = self.triple_index
+        hops = {}
+        for start_instance, (_, suffixes) in movie_suffixes.items():
+            if any(len(triple_index.get(key, ())) != count for key, count in suffixes.lookups.items()):
+                continue
+            path_hops = {}
+            for path_no, ont_path in enumerate(self.ontology_path_list):
+                if tuple(ont_path) not in suffixes.paths:
+                    continue
+                subj_cl, prop, obj_cl = property_dict[ont_path[0]]
+                movie_cl = obj_cl if subj_cl == start_cl_id else subj_cl
+                hop_triples = triple_index.get((prop, start_cl_id, start_instance), ())
+                if len(hop_triples) != 1 or hop_triples[0].get_instance_of(movie_cl) != suffixes.movie_inst:
+                    path_hops = None
+                    break
+                path_hops[path_no] = hop_triples[0].idx
+            if path_hops:
+                hops[start_instance] = path_hops
+        return hops
+
+    def find_all_triple_paths(self, start_cl, start_instances, movie_suffixes=None):
+        """
+        Batched find_triple_paths: walks the ontology path trie once, expanding the
+        frontier of every start instance together level by level.
+        movie_suffixes: optional {start_instance: (first_triple_id, MovieSuffixes)} of paths past
+        the hop to the start instance's movie, precomputed over the movie's own metadata triples
+        (whose IDs here start at first_triple_id); see movie_suffix_hops for when they are used.
+        Returns {start_instance: triple_paths} in the same order as per-instance calls.
+        """
+        start_cl_id = self.mapper.get_id(start_cl) if isinstance(start_cl, str) else start_cl
+
+        if diagnostics.enabled('paths', logging.DEBUG):
+            for start_instance in start_instances:
+                diagnostics.log('paths', '----------------- STARTING POINT: {a}, {b} -----------------'.format(
+                    a=self.mapper.get_str(start_cl_id),
+                    b=self.mapper.get_str(start_instance)), level=logging.DEBUG)
+
+        ontology_path_list = self.ontology_path_list
+
+        # Paths are bucketed per ontology path so the final order matches per-path traversal
+        path_buckets = {start_instance: [[] for _ in ontology_path_list] for start_instance in start_instances}
+
+        # Start instances with usable movie suffixes only walk the paths that do not go through the movie
+        hops = self.movie_suffix_hops(start_cl_id, movie_suffixes) if movie_suffixes else {}
+        level = [(self.build_path_trie(ontology_path_list), start_cl_id,
+                  [(start_instance, start_instance, []) for start_instance in start_instances
+                   if start_instance not in hops])]
+        memoized = {}
+        for start_instance, path_hops in hops.items():
+            memoized.setdefault(frozenset(path_hops), []).append(start_instance)
+        for skip, memoized_instances in memoized.items():
+            level.append((self.build_path_trie(ontology_path_list, skip), start_cl_id,
+                          [(start_instance, start_instance, []) for start_instance in memoized_instances]))
+
+        self.walk_path_trie(level, self.property_dict, self.triple_index, path_buckets, self.prop_triples_dict)
+
+        # The movie's suffix paths, shifted to this user's triple IDs
+        for start_instance, path_hops in hops.items():
+            first_triple_id, suffixes = movie_suffixes[start_instance]
+            buckets = path_buckets[start_instance]
+            for path_no, hop in path_hops.items():
+                buckets[path_no] = [[hop] + [first_triple_id + pos for pos in suffix]
+                                    for suffix in suffixes.paths[tuple(ontology_path_list[path_no])]]
+        self.memoized_starts = len(hops)
+
+        return {start_instance: [path for bucket in buckets for path in bucket]
+                for start_instance, buckets in path_buckets.items()}
+
     def get_chunking_type(self):
         prop_type_dict = {'either': [], 'both': []}
 
@@ -222,92 +437,109 @@ class FSMEngine:
             if dom in self.option_class_ids and ran in self.option_class_ids:
                 prop_type_dict['both'].append(property_id)
 
-        log_data('prop_chunk_type_dict', str(prop_type_dict))
+        log_data('prop_chunk_type_dict', prop_type_dict, channel='chunking', level=logging.DEBUG)
         return prop_type_dict
 
-    def make_freq_depth(self, triple, transactions):
-        freq_depth = [len(transactions), '0', 0, '0']
-
-        # Convert back to string to parse depth
-        sbj_inst_str = self.mapper.get_str(triple.subj_inst)
-        obj_inst_str = self.mapper.get_str(triple.obj_inst)
-        
-        sbj_depth = 0
-        if ':' in sbj_inst_str:
-            try:
-                sbj_depth = int(sbj_inst_str[sbj_inst_str.find('_') + 1:sbj_inst_str.find(':')])
-            except ValueError:
-                pass
-        obj_depth = 0
-        if ':' in obj_inst_str:
-            try:
-                obj_depth = int(obj_inst_str[obj_inst_str.find('_') + 1:obj_inst_str.find(':')])
-            except ValueError:
-                pass
-
-        freq_depth[2] = max(sbj_depth, obj_depth)
-        return freq_depth
-
-    def generate_candidate(self, it_hash, itid_tr, threshold):
+    def chunk_node(self, depth, n):
+        """
+        ID of chunk node (depth, n): an IID when n is a triple ID, a label when n is a
+        label number. IDs are negative so they never collide with mapper IDs.
+        """
+        key = (depth, n)
+        node = self.chunk_ids.get(key)
+        if node is None:
+            self.chunk_keys.append(key)
+            node = -len(self.chunk_keys)
+            self.chunk_ids[key] = node
+        return node
+
+    def inst_depth(self, inst):
+        if inst < 0:
+            return self.chunk_keys[-inst - 1][0]
+        return 0
+
+    def chunk_ref(self, inst):
+        """Returns the triple ID a chunk instance refers to, or None for a plain instance."""
+        if inst < 0:
+            return self.chunk_keys[-inst - 1][1]
+        return None
+
+    def inst_str(self, inst):
+        """String form of an instance for export; a chunk instance is written as its triple ID."""
+        if inst < 0:
+            return str(self.chunk_keys[-inst - 1][1])
+        return self.mapper.get_str(inst)
+
+    def build_it_hash(self, triple_dict, itid_tr):
+        """Working copy of the triples in the representation of the selected backend."""
+        if self.backend == 'columnar':
+            return TripleColumns.from_triples(triple_dict, itid_tr)
+        return {k: v.copy() for k, v in triple_dict.items()}
+
+    def assign_same_codes(self, it_hash, same_itids):
+        if isinstance(it_hash, TripleColumns):
+            # Rows are looked up once, not found by a scan per triple
+            row_of = it_hash.row_of()
+            same_code = it_hash.same_code
+
+            def get_same_code(tid):
+                return int(same_code[row_of[tid]])
+
+            def set_same_code(tid, code):
+                same_code[row_of[tid]] = code
+        else:
+            def get_same_code(tid):
+                return it_hash[tid].same_code
+
+            def set_same_code(tid, code):
+                it_hash[tid].set_same_code(code)
+
+        same_code_number = 1
+        for tid, iso_trip_lst in same_itids.items():
+            if get_same_code(tid) == 0:
+                same_code_str = f"same_{same_code_number}"
+                same_code_id = self.mapper.get_id(same_code_str)
+                for iso_trip in iso_trip_lst:
+                    if get_same_code(iso_trip) == 0:
+                        set_same_code(iso_trip, same_code_id)
+                same_code_number += 1
+
+    def iso_code(self, triple):
+        """
+        Isomorphism code of a triple: option classes abstracted to the class,
+        chunk instances replaced by their label.
+        """
         ChunkID_Label = self.ChunkID_Label
-        ITID_Freq_depth = self.ITID_Freq_depth
-        depth_chunk = self.depth_chunk
-
-        it_hash_temp = {k: v.copy() for k, v in it_hash.items()}
-
-        for tid, triple in it_hash_temp.items():
-            sbj_cl = triple.subj_cl
-            obj_cl = triple.obj_cl
-            sbj_inst = triple.subj_inst
-            obj_inst = triple.obj_inst
-
-            # Use IDs
-            if sbj_cl in self.option_class_ids:
-                triple.set_subj_inst(sbj_cl)
-            if obj_cl in self.option_class_ids:
-                triple.set_obj_inst(obj_cl)
-
-            if sbj_inst in ChunkID_Label:
-                triple.set_subj_inst(ChunkID_Label[sbj_inst])
-            if obj_inst in ChunkID_Label:
-                triple.set_obj_inst((ChunkID_Label[obj_inst]))
-
-        # Use tuple_code instead of str_code for hashing
-        it_hash_temp_code = {tid: triple.tuple_code() for tid, triple in it_hash_temp.items()}
-
-        iso_triples_dict = defaultdict(list)
-        for tid, code in it_hash_temp_code.items():
-            iso_triples_dict[code].append(tid)
-
-        if not iso_triples_dict:
-            return {}, {}
-
-        max_freq = max([len(triples) for _, triples in iso_triples_dict.items()])
+        sbj_inst = triple.subj_inst
+        obj_inst = triple.obj_inst
 
-        same_triples_dict = {tid: tid_list for _, tid_list in iso_triples_dict.items() for tid in tid_list}
+        if sbj_inst in ChunkID_Label:
+            sbj_code = ChunkID_Label[sbj_inst]
+        elif triple.subj_cl in self.option_class_ids:
+            sbj_code = triple.subj_cl
+        else:
+            sbj_code = sbj_inst
 
-        ITID_Trs = {tid: set(itid_tr[t] for t in iso_trip_lst) for tid, iso_trip_lst in same_triples_dict.items()}
+        if obj_inst in ChunkID_Label:
+            obj_code = ChunkID_Label[obj_inst]
+        elif triple.obj_cl in self.option_class_ids:
+            obj_code = triple.obj_cl
+        else:
+            obj_code = obj_inst
 
-        for tid, iso_trip_trans in ITID_Trs.items():
-            ITID_Freq_depth[tid] = self.make_freq_depth(it_hash_temp[tid], iso_trip_trans)
+        return (triple.subj_cl, sbj_code, triple.prop, triple.obj_cl, obj_code)
 
-        min_depth = min([freq_depth[2] for _, freq_depth in ITID_Freq_depth.items() if
-                         (freq_depth[0] == max_freq) and (freq_depth[1] != '1')], default=0)
+    def generate_candidate(self, it_hash, itid_tr, threshold):
+        if isinstance(it_hash, TripleColumns):
+            return self.generate_candidate_columnar(it_hash, threshold)
+        return IsoClassIndex(self, it_hash, itid_tr).select(threshold)
 
+    def label_candidates(self, same_itids):
+        """Gives every candidate triple a chunk IID labeled by its class. Returns the IIDs."""
+        ChunkID_Label = self.ChunkID_Label
+        depth_chunk = self.depth_chunk
         label_no = 0
-        num_of_candidates = 0
-        candi_it_tr = dict()
-        same_itids = dict()
-
-        for tid, iso_trip_trans in ITID_Trs.items():
-            freq_depth = ITID_Freq_depth[tid]
-            frequency, depth = freq_depth[0], freq_depth[2]
-            if frequency >= threshold:
-                if frequency == max_freq and depth == min_depth:
-                    candi_it_tr[tid] = itid_tr[tid]
-                    ITID_Freq_depth[tid] = [frequency, '1', depth, None]
-                    num_of_candidates += 1
-                    same_itids[tid] = set(same_triples_dict[tid])
+        new_IIDs = []
 
         candi_triples_list = []
         for iso_trip_lst in same_itids.values():
@@ -315,121 +547,280 @@ class FSMEngine:
                 candi_triples_list.append(iso_trip_lst)
 
         for candi_triples in candi_triples_list:
-            # Generate labels using string manipulation then convert to ID
-            # label string: "_{(depth_chunk + 1)}:{label_no}"
-            label_str = f"_{(depth_chunk + 1)}:{label_no}"
-            label_id = self.mapper.get_id(label_str)
+            label_id = self.chunk_node(depth_chunk + 1, label_no)
             
             for candi_triple in candi_triples:
                 # candi_triple is TID (int)
-                new_IID_str = f"_{(depth_chunk + 1)}:{candi_triple}"
-                new_IID = self.mapper.get_id(new_IID_str)
+                new_IID = self.chunk_node(depth_chunk + 1, candi_triple)
                 ChunkID_Label[new_IID] = label_id
+                new_IIDs.append(new_IID)
             label_no += 1
 
+        return new_IIDs
+
+    def generate_candidate_columnar(self, it_hash, threshold, written=None):
+        """
+        generate_candidate for TripleColumns: relabeling, grouping by isomorphism code
+        and transaction counting run as array operations. Produces the same candidates,
+        ITID_Freq_depth entries and labels, in the same order, as the object backend.
+        written: optional (frequency, depth) arrays aligned with the rows of it_hash, holding
+        the unflagged ITID_Freq_depth entries last written for them (-1 for none). Only the
+        entries that changed are rewritten, and the arrays are updated in place.
+        """
+        ITID_Freq_depth = self.ITID_Freq_depth
+
+        if len(it_hash) == 0:
+            return {}, {}
+
+        # Option-class abstraction, then chunk labels (looked up on the original instances)
+        option_ids = np.fromiter(self.option_class_ids, dtype=np.int64, count=len(self.option_class_ids))
+        subj_inst = np.where(np.isin(it_hash.subj_cl, option_ids), it_hash.subj_cl, it_hash.subj_inst)
+        obj_inst = np.where(np.isin(it_hash.obj_cl, option_ids), it_hash.obj_cl, it_hash.obj_inst)
+
+        label_keys, label_values = sorted_mapping(self.ChunkID_Label)
+        hit, labels = lookup(label_keys, label_values, it_hash.subj_inst)
+        subj_inst[hit] = labels
+        hit, labels = lookup(label_keys, label_values, it_hash.obj_inst)
+        obj_inst[hit] = labels
+
+        # Isomorphism classes, numbered in order of first occurrence, from one lexicographic sort
+        codes = (it_hash.subj_cl, subj_inst, it_hash.prop, it_hash.obj_cl, obj_inst)
+        by_code = np.lexsort(codes[::-1])
+        new_code = np.zeros(len(it_hash), dtype=bool)
+        new_code[0] = True
+        for column in codes:
+            sorted_column = column[by_code]
+            new_code[1:] |= sorted_column[1:] != sorted_column[:-1]
+        first_row = np.minimum.reduceat(by_code, np.flatnonzero(new_code))
+        rank = np.empty_like(first_row)
+        rank[np.argsort(first_row)] = np.arange(len(first_row))
+        group = np.empty(len(it_hash), dtype=np.int64)
+        group[by_code] = rank[np.cumsum(new_code) - 1]
+
+        # Frequency: number of distinct transactions per class. max_freq is the largest
+        # class size, as in the object backend.
+        _, tr_rank = np.unique(it_hash.tr, return_inverse=True)
+        tr_count = int(tr_rank.max()) + 1
+        group_tr = np.unique(group * tr_count + tr_rank.reshape(-1))
+        freq = np.bincount(group_tr // tr_count, minlength=len(first_row))
+        max_freq = int(np.bincount(group).max())
+
+        # Depth: parse each distinct instance once
+        insts = np.unique(np.concatenate([subj_inst, obj_inst]))
+        inst_depths = np.fromiter((self.inst_depth(i) for i in insts.tolist()), dtype=np.int64, count=len(insts))
+        depth = np.maximum(inst_depths[np.searchsorted(insts, subj_inst)],
+                           inst_depths[np.searchsorted(insts, obj_inst)])
+
+        # Rows class by class, as same_triples_dict iterates them
+        order = np.argsort(group, kind='stable')
+        tids = it_hash.idx[order]
+        row_group = group[order]
+        row_freq = freq[row_group]
+        row_depth = depth[order]
+
+        stale = np.arange(len(order))
+        if written is not None:
+            written_freq, written_depth = written
+            stale = np.flatnonzero((written_freq[order] != row_freq) | (written_depth[order] != row_depth))
+            written_freq[order] = row_freq
+            written_depth[order] = row_depth
+        for tid, frequency, row_d in zip(tids[stale].tolist(), row_freq[stale].tolist(), row_depth[stale].tolist()):
+            ITID_Freq_depth[tid] = [frequency, '0', row_d, '0']
+
+        # Every entry not flagged '1' was just written, so the frontier is among these rows
+        at_max = row_freq == max_freq
+        min_depth = int(row_depth[at_max].min()) if at_max.any() else 0
+
+        candi_it_tr = dict()
+        same_itids = dict()
+
+        chosen = np.flatnonzero((row_freq >= threshold) & at_max & (row_depth == min_depth))
+        if written is not None:
+            written_freq[order[chosen]] = -1
+        chosen_groups = np.unique(row_group[chosen])
+        lo = np.searchsorted(row_group, chosen_groups, side='left')
+        hi = np.searchsorted(row_group, chosen_groups, side='right')
+        class_tids = {g: tids[a:b] for g, a, b in zip(chosen_groups.tolist(), lo.tolist(), hi.tolist())}
+        for row in chosen.tolist():
+            tid = int(tids[row])
+            candi_it_tr[tid] = int(it_hash.tr[order[row]])
+            ITID_Freq_depth[tid] = [int(row_freq[row]), '1', int(row_depth[row]), None]
+            same_itids[tid] = set(class_tids[int(row_group[row])].tolist())
+
+        self.label_candidates(same_itids)
         return candi_it_tr, same_itids
 
+    def record_chunk(self, candidate, left_cl, left_i, prop, right_cl, right_i, tr_of_candidate):
+        # Chunk instances stay chunk node IDs; chunk_ref / inst_str resolve them to the triple ID
+        if left_cl in self.option_class_ids:
+            left_i = left_cl
+        if right_cl in self.option_class_ids:
+            right_i = right_cl
+
+        # Chunking_Result stores IDs. We will map them back to strings at the end.
+        self.Chunking_Result[candidate] = [str(self.depth_chunk), left_i, prop, right_i, tr_of_candidate, '1']
+
     def chunking(self, candidates, it_hash, itid_tr, threshold):
-        self.depth_chunk += 1
-        
-        it_hash_temp = {k: v.copy() for k, v in it_hash.items()}
-        itid_tr_temp = itid_tr.copy()
+        """
+        Chunks the candidates, then keeps chunking the next candidates generated
+        from the result until none are left. Runs as a loop over chunk depths.
+
+        The working set shares Triple objects with it_hash until a triple is
+        relabeled (copy-on-write), so the caller's triples are left untouched.
+        The transaction -> triples index is built once and updated as candidates
+        are consumed.
+        """
+        if isinstance(it_hash, TripleColumns):
+            return self.chunking_columnar(candidates, it_hash, threshold)
+
+        start_depth = self.depth_chunk
 
+        it_hash_temp = dict(it_hash)
+        itid_tr_temp = dict(itid_tr)
+
+        # Isomorphism classes maintained across levels; only touched triples are re-hashed
+        iso_index = IsoClassIndex(self, it_hash_temp, itid_tr_temp)
+
+        # Ordered set of triples per transaction (dict keys, O(1) removal)
         Tr_IT_hash = dict()
         for triple, transaction in itid_tr_temp.items():
             if transaction in Tr_IT_hash:
-                Tr_IT_hash[transaction] = Tr_IT_hash[transaction] + [triple]
+                Tr_IT_hash[transaction][triple] = None
             else:
-                Tr_IT_hash[transaction] = [triple]
+                Tr_IT_hash[transaction] = {triple: None}
 
-        number_of_chunk = 0
-        for candidate in candidates:
-            # Create new IID string then convert to ID
-            new_IID_str = f"_{self.depth_chunk}:{candidate}"
-            new_IID = self.mapper.get_id(new_IID_str)
-            
-            tr_of_candidate = itid_tr_temp[candidate]
-            cand_subj_inst = it_hash_temp[candidate].subj_inst
-            cand_obj_inst = it_hash_temp[candidate].obj_inst
-
-            number_of_chunk += 1
-
-            cand_triple = it_hash[candidate]
-            left_i = cand_triple.subj_inst
-            right_i = cand_triple.obj_inst
-            left_cl = cand_triple.subj_cl
-            right_cl = cand_triple.obj_cl
-
-            # String processing for 'Chunking_Result' (keeping IDs, logic needs check)
-            # Logic: if ':' in left_i... 
-            # We need to check string representation
-            left_i_str = self.mapper.get_str(left_i)
-            right_i_str = self.mapper.get_str(right_i)
-            
-            if ':' in left_i_str:
-                # split and take [1]
-                parts = left_i_str.split(':')
-                if len(parts) > 1:
-                    left_i_str = parts[1]
-                    # Note: We probably need the ID of this part?
-                    # The original code stored string in Chunking_Result.
-                    # We can store ID if we map back later.
-                    # For now let's store ID corresponding to that part string.
-                    left_i = self.mapper.get_id(left_i_str)
-            
-            if ':' in right_i_str:
-                parts = right_i_str.split(':')
-                if len(parts) > 1:
-                    right_i_str = parts[1]
-                    right_i = self.mapper.get_id(right_i_str)
-            
-            if left_cl in self.option_class_ids:
-                left_i = left_cl
-            if right_cl in self.option_class_ids:
-                right_i = right_cl
+        while True:
+            self.depth_chunk += 1
+            level_started = time.perf_counter()
 
-            # Chunking_Result stores IDs. We will map them back to strings at the end.
-            self.Chunking_Result[candidate] = [str(self.depth_chunk), left_i, cand_triple.prop, right_i, tr_of_candidate, '1']
+            # Undo log of this level: triples as they were before this level relabeled them
+            level_start = dict()
 
-            if tr_of_candidate in Tr_IT_hash:
-                if candidate in Tr_IT_hash[tr_of_candidate]:
-                     Tr_IT_hash[tr_of_candidate].remove(candidate)
-            
-            it_hash_temp.pop(candidate, None)
-            itid_tr_temp.pop(candidate, None)
-
-            if tr_of_candidate in Tr_IT_hash:
-                for other_triple_id in Tr_IT_hash[tr_of_candidate]:
-                    triple = it_hash_temp[other_triple_id]
-                    share_subj_condition = triple.subj_inst == cand_subj_inst or triple.subj_inst == cand_obj_inst
-                    share_obj_condition = triple.obj_inst == cand_subj_inst or triple.obj_inst == cand_obj_inst
-
-                    if share_subj_condition and share_obj_condition:
-                        triple.subj_inst = new_IID
-                        triple.subj_cl = self.ChunkID_Label[new_IID]
-                        it_hash_temp[other_triple_id] = triple
-                    elif share_subj_condition:
-                        triple.subj_inst = new_IID
-                        triple.subj_cl = self.ChunkID_Label[new_IID]
-                        it_hash_temp[other_triple_id] = triple
-                    elif share_obj_condition:
-                        triple.obj_inst = new_IID
-                        triple.obj_cl = self.ChunkID_Label[new_IID]
-                        it_hash_temp[other_triple_id] = triple
-                    else:
-                        pass
+            for candidate in candidates:
+                new_IID = self.chunk_node(self.depth_chunk, candidate)
 
-        candi_it_tr_t, same_itids = self.generate_candidate(it_hash=it_hash_temp, itid_tr=itid_tr_temp, threshold=threshold)
+                tr_of_candidate = itid_tr_temp[candidate]
+                cand_subj_inst = it_hash_temp[candidate].subj_inst
+                cand_obj_inst = it_hash_temp[candidate].obj_inst
+
+                cand_triple = level_start.get(candidate, it_hash_temp[candidate])
+                self.record_chunk(candidate, cand_triple.subj_cl, cand_triple.subj_inst, cand_triple.prop,
+                                  cand_triple.obj_cl, cand_triple.obj_inst, tr_of_candidate)
+
+                if tr_of_candidate in Tr_IT_hash:
+                    Tr_IT_hash[tr_of_candidate].pop(candidate, None)
+
+                iso_index.remove(candidate)
+                it_hash_temp.pop(candidate, None)
+                itid_tr_temp.pop(candidate, None)
+
+                if tr_of_candidate in Tr_IT_hash:
+                    for other_triple_id in Tr_IT_hash[tr_of_candidate]:
+                        triple = it_hash_temp[other_triple_id]
+                        share_subj_condition = triple.subj_inst == cand_subj_inst or triple.subj_inst == cand_obj_inst
+                        share_obj_condition = triple.obj_inst == cand_subj_inst or triple.obj_inst == cand_obj_inst
+
+                        if not (share_subj_condition or share_obj_condition):
+                            continue
+
+                        if other_triple_id not in level_start:
+                            level_start[other_triple_id] = triple
+                            triple = triple.copy()
+                            it_hash_temp[other_triple_id] = triple
+
+                        if share_subj_condition:
+                            triple.subj_inst = new_IID
+                            triple.subj_cl = self.ChunkID_Label[new_IID]
+                        else:
+                            triple.obj_inst = new_IID
+                            triple.obj_cl = self.ChunkID_Label[new_IID]
+                        iso_index.update(other_triple_id)
+
+            candi_it_tr_t, same_itids = iso_index.select(threshold)
+
+            self.level_seconds.append(time.perf_counter() - level_started)
+            if len(candi_it_tr_t) == 0:
+                break
 
-        if len(candi_it_tr_t) == 0:
-            self.depth_chunk -= 1
-            return
-        else:
             sampled_candidate = list(candi_it_tr_t.keys())[0]
-            next_candidates = same_itids[sampled_candidate]
-            self.chunking(candidates=next_candidates, it_hash=it_hash_temp, itid_tr=itid_tr_temp, threshold=threshold)
-            self.depth_chunk -= 1
-            return
+            candidates = same_itids[sampled_candidate]
+
+        self.depth_chunk = start_depth
+
+    def chunking_columnar(self, candidates, it_hash, threshold):
+        """
+        chunking for TripleColumns. Candidates are applied in the same order as the
+        object backend; each one relabels the triples of its transaction with array masks.
+        The columns are copied once and relabeled in place across levels; rows relabeled
+        in a level keep their level-start labels in an undo log, as in the object backend.
+        """
+        start_depth = self.depth_chunk
+
+        cols = it_hash.copy()
+        row_of = cols.row_of()
+        rows_by_tr = cols.rows_by_tr()
+        alive = np.ones(len(cols), dtype=bool)
+
+        # Undo log of the current level: (subj_cl, subj_inst, obj_cl, obj_inst) of relabeled rows
+        relabeled = np.zeros(len(cols), dtype=bool)
+        level_start = tuple(np.empty_like(cols.idx) for _ in range(4))
+
+        # ITID_Freq_depth entries last written per row, so each level only rewrites the changed ones
+        written_freq = np.full(len(cols), -1, dtype=np.int64)
+        written_depth = np.full(len(cols), -1, dtype=np.int64)
+
+        while True:
+            self.depth_chunk += 1
+            level_started = time.perf_counter()
+
+            for candidate in candidates:
+                new_IID = self.chunk_node(self.depth_chunk, candidate)
+
+                row = row_of[candidate]
+                tr_of_candidate = int(cols.tr[row])
+                cand_subj_inst = cols.subj_inst[row]
+                cand_obj_inst = cols.obj_inst[row]
+
+                source = level_start if relabeled[row] else (cols.subj_cl, cols.subj_inst, cols.obj_cl, cols.obj_inst)
+                subj_cl, subj_inst, obj_cl, obj_inst = (int(column[row]) for column in source)
+                self.record_chunk(candidate, subj_cl, subj_inst, int(cols.prop[row]), obj_cl, obj_inst, tr_of_candidate)
+
+                alive[row] = False
+
+                rows = rows_by_tr[tr_of_candidate]
+                rows = rows[alive[rows]]
+                subj_inst = cols.subj_inst[rows]
+                obj_inst = cols.obj_inst[rows]
+                share_subj = (subj_inst == cand_subj_inst) | (subj_inst == cand_obj_inst)
+                share_obj = ((obj_inst == cand_subj_inst) | (obj_inst == cand_obj_inst)) & ~share_subj
+
+                if share_subj.any() or share_obj.any():
+                    touched = rows[share_subj | share_obj]
+                    first_touch = touched[~relabeled[touched]]
+                    for saved, column in zip(level_start, (cols.subj_cl, cols.subj_inst, cols.obj_cl, cols.obj_inst)):
+                        saved[first_touch] = column[first_touch]
+                    relabeled[first_touch] = True
+
+                    label = self.ChunkID_Label[new_IID]
+                    cols.subj_inst[rows[share_subj]] = new_IID
+                    cols.subj_cl[rows[share_subj]] = label
+                    cols.obj_inst[rows[share_obj]] = new_IID
+                    cols.obj_cl[rows[share_obj]] = label
+
+            relabeled[:] = False
+            alive_rows = np.flatnonzero(alive)
+            written = (written_freq[alive_rows], written_depth[alive_rows])
+            candi_it_tr_t, same_itids = self.generate_candidate_columnar(cols.take(alive_rows), threshold, written)
+            written_freq[alive_rows], written_depth[alive_rows] = written
+
+            self.level_seconds.append(time.perf_counter() - level_started)
+            if len(candi_it_tr_t) == 0:
+                break
+
+            sampled_candidate = list(candi_it_tr_t.keys())[0]
+            candidates = same_itids[sampled_candidate]
+
+        self.depth_chunk = start_depth
 
     def find_result(self, triple_id):
         self.chunk_stack.append(triple_id)
@@ -437,8 +828,8 @@ class FSMEngine:
         if triple_id not in self.chunking_result_final:
             return 
 
-        left = self.chunking_result_final[triple_id][1]
-        right = self.chunking_result_final[triple_id][3]
+        left = self.chunk_ref(self.chunking_result_final[triple_id][1])
+        right = self.chunk_ref(self.chunking_result_final[triple_id][3])
 
         if left in self.chunking_result_final:
             self.find_result(left)
@@ -0,0 +1,88 @@
+import json
+import os
+import glob
+import hashlib
+import pandas as pd
+from .config import MANIFEST_FILE, SUBGRAPHS_FOLDER
+from .executors import shard_path
+
+# One JSON line per finished user, appended by the worker that finished it:
+# {"user_id", "ratings": ratings fingerprint, "run": run fingerprint, "status", "outputs"}
+# The last line for a user wins. status is 'done' or 'skipped' (not enough data).
+
+
+def ratings_fingerprint(user_series):
+    """Fingerprint of one user's rating rows."""
+    hashed = pd.util.hash_pandas_object(user_series[['tmdbId', 'rating', 'timestamp']], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """{user_id: latest entry}. A torn last line from a killed run is ignored."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry['user_id']] = entry
+    return entries
+
+
+def shard_manifest_file(shard, path=MANIFEST_FILE):
+    """Manifest written by shard (i, N), next to the main one: manifest.shard-i-of-N.jsonl"""
+    return shard_path(path, shard)
+
+
+def merge_shard_manifests(path=MANIFEST_FILE):
+    """
+    Folds every shard manifest next to path into it (a shard's entry replaces the main one)
+    and removes the shard files. Returns (shard files merged, users in the merged manifest).
+    """
+    root, ext = os.path.splitext(path)
+    shard_files = sorted(glob.glob(f'{glob.escape(root)}.shard-*-of-*{ext}'))
+
+    entries = load_manifest(path)
+    for shard_file in shard_files:
+        entries.update(load_manifest(shard_file))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        for user_id in sorted(entries):
+            f.write(json.dumps(entries[user_id]) + '\n')
+    os.replace(tmp_path, path)
+    for shard_file in shard_files:
+        os.remove(shard_file)
+    return len(shard_files), len(entries)
+
+
+def reset_manifest(path=MANIFEST_FILE):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def record_user(user_id, ratings_key, run_key, status, outputs, path=MANIFEST_FILE):
+    line = json.dumps({'user_id': int(user_id), 'ratings': ratings_key, 'run': run_key,
+                       'status': status, 'outputs': outputs}) + '\n'
+    # A single append of one short line, so concurrent workers do not interleave
+    with open(path, 'a') as f:
+        f.write(line)
+
+
+def is_recorded(entry, run_key, only_changed=False):
+    """The part of is_complete that needs neither the user's ratings nor the output files."""
+    return entry is not None and (only_changed or entry['run'] == run_key)
+
+
+def is_complete(entry, ratings_key, run_key, only_changed=False):
+    """
+    True if the user can be skipped: finished with the same ratings and all outputs present.
+    The run fingerprint (schema, metadata, mining parameters) must match too, unless
+    only_changed is set, in which case only a change in the user's ratings triggers re-mining.
+    """
+    if not is_recorded(entry, run_key, only_changed) or entry['ratings'] != ratings_key:
+        return False
+    return all(os.path.exists(os.path.join(SUBGRAPHS_FOLDER, output)) for output in entry['outputs'])
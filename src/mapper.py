@@ -1,3 +1,6 @@
+from bisect import bisect_right
+
+
 class StringMapper:
     def __init__(self):
         self.str_to_int = {}
@@ -25,3 +28,54 @@ class StringMapper:
         """Pre-load schema terms to ensure consistent IDs for classes/properties."""
         for term in terms:
             self.get_id(term)
+
+
+class OverlayStringMapper(StringMapper):
+    """
+    Per-user mapper layered over a shared, read-only base vocabulary.
+    Base IDs are looked up in place; only the IDs this user creates are stored locally,
+    numbered after the base exactly as a copied StringMapper would number them.
+    """
+    def __init__(self, base_str_to_int, base_int_to_str):
+        super().__init__()
+        self.base_str_to_int = base_str_to_int
+        self.base_int_to_str = base_int_to_str
+        self.base_size = len(base_int_to_str)  # Base IDs are 1..base_size-1
+        self.int_to_str = []  # index = ID - base_size, None for reserved IDs
+        self.counter = self.base_size - 1
+        self.reserved_first = []  # First ID of each reserved block
+        self.reserved_names = []  # Its name function
+
+    def get_id(self, s):
+        idx = self.base_str_to_int.get(s)
+        if idx is not None:
+            return idx
+        if s not in self.str_to_int:
+            self.counter += 1
+            self.str_to_int[s] = self.counter
+            self.int_to_str.append(s)
+        return self.str_to_int[s]
+
+    def reserve(self, count, name_of):
+        """
+        Creates count new IDs at once and returns the first. The string of the i-th is
+        name_of(i), built only when get_str asks for it; get_id does not know these
+        strings, so only reserve terms that are never looked up by string.
+        """
+        first = self.counter + 1
+        self.counter += count
+        self.int_to_str.extend([None] * count)
+        self.reserved_first.append(first)
+        self.reserved_names.append(name_of)
+        return first
+
+    def get_str(self, idx):
+        if idx < self.base_size:
+            return self.base_int_to_str[idx]
+        if idx - self.base_size < len(self.int_to_str):
+            s = self.int_to_str[idx - self.base_size]
+            if s is None:
+                block = bisect_right(self.reserved_first, idx) - 1
+                s = self.reserved_names[block](idx - self.reserved_first[block])
+            return s
+        return str(idx) # Fallback if something is wrong
@@ -0,0 +1,93 @@
+import json
+import heapq
+import time
+from collections import defaultdict
+
+# Stages of process_single_user, in order
+STAGES = ('load', 'triple_build', 'store_triples', 'schema_filter', 'path_finding',
+          'candidate_generation', 'chunking', 'export')
+SLOWEST_USERS = 20
+
+
+class UserMetrics:
+    """Per-stage wall time (perf_counter) and counters of one user."""
+
+    def __init__(self, user_id):
+        self.user_id = int(user_id)
+        self.stages = {}
+        self.counters = {}
+        self.chunking_levels = []
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """Charges the time since the previous lap to stage."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, name, value):
+        self.counters[name] = int(value)
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return {'user_id': self.user_id, 'total': self.total(), 'stages': self.stages,
+                'chunking_levels': self.chunking_levels, 'counters': self.counters}
+
+    def line(self):
+        return ', '.join(f'{stage}: {seconds:.3f}s' for stage, seconds in self.stages.items())
+
+
+class RunSummary:
+    """Aggregates the per-user metrics sent back by the workers; optionally logs each user as a JSON line."""
+
+    def __init__(self, user_metrics_file=None):
+        self.users = 0
+        self.stage_total = defaultdict(float)
+        self.stage_max = defaultdict(float)
+        self.counter_total = defaultdict(int)
+        self.counter_max = defaultdict(int)
+        self.chunking_levels = 0
+        self.slowest = []  # min-heap of (total, user_id, metrics)
+        self.user_metrics = open(user_metrics_file, 'w') if user_metrics_file else None
+
+    def add(self, metrics):
+        self.users += 1
+        for stage, seconds in metrics['stages'].items():
+            self.stage_total[stage] += seconds
+            self.stage_max[stage] = max(self.stage_max[stage], seconds)
+        for name, value in metrics['counters'].items():
+            self.counter_total[name] += value
+            self.counter_max[name] = max(self.counter_max[name], value)
+        self.chunking_levels += len(metrics['chunking_levels'])
+
+        entry = (metrics['total'], metrics['user_id'], metrics)
+        if len(self.slowest) < SLOWEST_USERS:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+        if self.user_metrics is not None:
+            self.user_metrics.write(json.dumps(metrics) + '\n')
+
+    def as_dict(self, **extra):
+        busy = sum(self.stage_total.values())
+        return {
+            'users': self.users,
+            'busy': busy,
+            'stages': {stage: {'total': total, 'max': self.stage_max[stage],
+                               'mean': total / self.users, 'share': total / busy if busy else 0.0}
+                       for stage, total in sorted(self.stage_total.items(), key=lambda item: STAGES.index(item[0]))},
+            'counters': {name: {'total': total, 'max': self.counter_max[name], 'mean': total / self.users}
+                         for name, total in sorted(self.counter_total.items())},
+            'chunking_levels': self.chunking_levels,
+            'slowest_users': [metrics for _, _, metrics in sorted(self.slowest, reverse=True)],
+            **extra
+        }
+
+    def write(self, path, **extra):
+        if self.user_metrics is not None:
+            self.user_metrics.close()
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(**extra), f, indent=2)
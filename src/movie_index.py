@@ -0,0 +1,148 @@
+import os
+import json
+import numpy as np
+from .config import MOVIE_INDEX_DIR, VOCAB_FILE
+from .data_loader import load_metadata_triples
+from .vocab import vocabulary_fingerprint, load_vocabulary, build_vocabulary, save_vocabulary, encode_metadata
+
+# Directory layout: movies.npy (sorted tmdbIds), nodes.npy (vocabulary ID of each movie's
+# 'MOVI_<tmdbId>' node), offsets.npy (len(movies) + 1) and triples.npy (one
+# (subj_cl, subj_inst, prop, obj_cl, obj_inst) row of vocabulary IDs per metadata triple).
+# Movie i owns triples[offsets[i]:offsets[i + 1]].
+# source.json holds the format and the vocabulary fingerprint the IDs belong to and is written last.
+MOVIE_PREFIX = 'MOVI_'
+INDEX_FORMAT_VERSION = 2
+
+_opened = {}  # directory -> MovieIndex, per process
+
+
+class MovieIndex:
+    """Memory-mapped movie -> metadata triples index."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.movies = np.load(os.path.join(directory, 'movies.npy'), mmap_mode='r')
+        self.nodes = np.load(os.path.join(directory, 'nodes.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r')
+        self.triples = np.load(os.path.join(directory, 'triples.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.movies)
+
+    def rows(self, tmdb_ids):
+        """Row of each tmdbId in the index, -1 for movies without metadata."""
+        tmdb_ids = np.asarray(tmdb_ids, dtype=np.int64)
+        if len(self.movies) == 0:
+            return np.full(len(tmdb_ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self.movies, tmdb_ids)
+        pos[pos == len(self.movies)] = 0
+        return np.where(self.movies[pos] == tmdb_ids, pos, -1)
+
+    def gather(self, rows):
+        """Metadata triples of the given rows (-1 rows skipped), concatenated in row order."""
+        rows = rows[rows >= 0]
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        if len(rows) == 0 or lengths.sum() == 0:
+            return self.triples[:0]
+        # Position k of a movie's run reads starts[movie] + k
+        run_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(starts - run_starts, lengths)
+        return self.triples[positions]
+
+    def movie_triples(self, tmdb_id):
+        """Encoded metadata triples of one movie as a (n, 5) array (empty if unknown)."""
+        row = self.rows([tmdb_id])[0]
+        if row < 0:
+            return self.triples[:0]
+        return self.triples[self.offsets[row]:self.offsets[row + 1]]
+
+
+def _tmdb_id(movi_key):
+    """tmdbId of a 'MOVI_<tmdbId>' key, or None for keys the pipeline never looks up."""
+    if not movi_key.startswith(MOVIE_PREFIX):
+        return None
+    digits = movi_key[len(MOVIE_PREFIX):]
+    if not digits.isdigit() or str(int(digits)) != digits:
+        return None
+    return int(digits)
+
+
+def build_movie_index(combined_metadata, mapper, key, directory=MOVIE_INDEX_DIR):
+    """Writes the index from encode_metadata output; each movie keeps its triple order."""
+    movies = sorted((_tmdb_id(movi_key), movi_key) for movi_key in combined_metadata
+                    if _tmdb_id(movi_key) is not None)
+
+    offsets = np.zeros(len(movies) + 1, dtype=np.int64)
+    for i, (_, movi_key) in enumerate(movies):
+        offsets[i + 1] = offsets[i] + len(combined_metadata[movi_key])
+
+    triples = np.empty((int(offsets[-1]), 5), dtype=np.int32)
+    for i, (_, movi_key) in enumerate(movies):
+        if offsets[i + 1] > offsets[i]:
+            triples[offsets[i]:offsets[i + 1]] = combined_metadata[movi_key]
+
+    os.makedirs(directory, exist_ok=True)
+    source_file = os.path.join(directory, 'source.json')
+    if os.path.exists(source_file):
+        os.remove(source_file)
+    np.save(os.path.join(directory, 'movies.npy'), np.array([tmdb_id for tmdb_id, _ in movies], dtype=np.int64))
+    np.save(os.path.join(directory, 'nodes.npy'),
+            np.array([mapper.str_to_int[movi_key] for _, movi_key in movies], dtype=np.int64))
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    np.save(os.path.join(directory, 'triples.npy'), triples)
+    with open(source_file, 'w') as f:
+        json.dump({'format': INDEX_FORMAT_VERSION, 'vocabulary': key}, f)
+
+
+def _stored_key(directory):
+    try:
+        with open(os.path.join(directory, 'source.json'), 'r') as f:
+            source = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if source.get('format') != INDEX_FORMAT_VERSION:
+        return None
+    return source.get('vocabulary')
+
+
+def open_movie_index(directory=MOVIE_INDEX_DIR):
+    """Maps the index once per process."""
+    if directory not in _opened:
+        _opened[directory] = MovieIndex(directory)
+    return _opened[directory]
+
+
+def build_index(vocab_path=VOCAB_FILE, directory=MOVIE_INDEX_DIR):
+    """
+    Offline build: loads the metadata pickles, then writes the vocabulary and the
+    movie index. Returns the vocabulary mapper.
+    """
+    key = vocabulary_fingerprint()
+    metadata_dicts = load_metadata_triples()
+
+    print("Building vocabulary...")
+    mapper = build_vocabulary(metadata_dicts)
+    save_vocabulary(mapper, key, vocab_path)
+    print(f"Saved vocabulary ({mapper.counter} terms) to {vocab_path}")
+
+    print("Building movie index...")
+    combined_metadata = encode_metadata(metadata_dicts, mapper)
+    build_movie_index(combined_metadata, mapper, key, directory)
+    _opened.pop(directory, None)
+    print(f"Saved movie index ({len(combined_metadata)} movies) to {directory}")
+    return mapper
+
+
+def load_or_build_index(vocab_path=VOCAB_FILE, directory=MOVIE_INDEX_DIR):
+    """
+    (mapper, MovieIndex). The metadata pickles are only read when the vocabulary or
+    the index is missing or was built from other schema/metadata files.
+    """
+    key = vocabulary_fingerprint()
+    stored_key, mapper = load_vocabulary(vocab_path)
+    if mapper is None or stored_key != key or _stored_key(directory) != key:
+        mapper = build_index(vocab_path, directory)
+    else:
+        print(f"Loaded vocabulary ({mapper.counter} terms) from {vocab_path}")
+    return mapper, open_movie_index(directory)
@@ -1,35 +1,162 @@
 import os
 import math
-import pickle
-import copy
-from datetime import datetime
-from collections import defaultdict
-import pandas as pd
-import logging
-from joblib import Parallel, delayed, cpu_count
+import time
+from collections import defaultdict, Counter
+import numpy as np
 
 from .config import (
     TRAINING_FOLDER, SUBGRAPHS_FOLDER, SCHEMA_FILE,
     START_CLASS, END_CLASS_LIST, OPTION_CLASS_LIST, MAX_DEPTH,
-    RECENT
+    RECENT, LOG_FILE, RESULT_BATCH_USERS, IN_FLIGHT_PER_WORKER, EXECUTOR, N_JOBS,
+    RUN_SUMMARY_FILE, USER_METRICS_FILE, SUFFIX_CACHE_MOVIES, THRESHOLDS
 )
-from .utils import log_data
+from . import diagnostics, manifest, shared_state, results, scheduling, executors, metrics, profiling, suffix_cache
+from .utils import content_fingerprint
 from .fsm import FSMEngine
-from .data_loader import load_mapped_data, load_metadata_triples
-from .mapper import StringMapper
+from .data_loader import load_mapped_data, open_mapped_data, metadata_paths
+from .mapper import OverlayStringMapper
+from .movie_index import MOVIE_PREFIX, load_or_build_index, open_movie_index
+from .compiled_schema import load_or_compile_schema
 
-def process_single_user(user_data, schema_data, combined_metadata, base_mapper_state):
-    user_id, user_series = user_data
-    original_property_dict, original_ontology_graph, original_ontology_path_list, original_path_property_set = schema_data
+def expand_user_triples(user_id, tmdb_ids, movie_index, mapper):
+    """
+    Triples of one user's watching events as an (n, 6) array of IDs
+    [triple_id, subj_cl, subj_inst, prop, obj_cl, obj_inst]: User -> WatchingEvent and
+    WatchingEvent -> Movie per event, then the metadata triples of each watched movie,
+    gathered from the movie index. Event nodes and triple IDs are reserved in the mapper
+    and only get their 'U<user>_M<movie>' / triple number strings when exported.
+    Also returns (event node, movie index row, ID of the movie's first metadata triple)
+    for every event whose movie has metadata.
+    """
+    user_cl, watching_event_cl, movie_cl = mapper.get_id("User"), mapper.get_id("WatchingEvent"), mapper.get_id("Movie")
+    user_watching, watching_movie = mapper.get_id("UserWatching"), mapper.get_id("WatchingMovie")
+    user_node = mapper.get_id(f"USER_{user_id}")
+
+    # One event node per distinct movie, numbered in watching order
+    tmdb_ids = np.asarray(tmdb_ids, dtype=np.int64)
+    movies, first_seen, inverse = np.unique(tmdb_ids, return_index=True, return_inverse=True)
+    order = np.argsort(first_seen, kind='stable')
+    movies = movies[order]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    first_event = mapper.reserve(len(movies), lambda i: f"U{user_id}_M{movies[i]}")
+    event_nodes = first_event + rank[inverse]
+
+    # Movie nodes come from the index; movies without metadata are interned by name
+    rows = movie_index.rows(tmdb_ids)
+    movie_nodes = np.where(rows >= 0, movie_index.nodes[np.maximum(rows, 0)], 0)
+    for i in np.flatnonzero(rows < 0).tolist():
+        movie_nodes[i] = mapper.get_id(f"{MOVIE_PREFIX}{tmdb_ids[i]}")
+
+    events = np.empty((2 * len(tmdb_ids), 5), dtype=np.int64)
+    events[0::2] = (user_cl, user_node, user_watching, watching_event_cl, 0)
+    events[0::2, 4] = event_nodes
+    events[1::2] = (watching_event_cl, 0, watching_movie, movie_cl, 0)
+    events[1::2, 1] = event_nodes
+    events[1::2, 4] = movie_nodes
+
+    triples = np.concatenate([events, movie_index.gather(rows).astype(np.int64)])
+    first_triple = mapper.reserve(len(triples), str)
+    triple_ids = np.arange(first_triple, first_triple + len(triples), dtype=np.int64)
+
+    known = rows >= 0
+    lengths = movie_index.offsets[rows[known] + 1] - movie_index.offsets[rows[known]]
+    metadata_first = first_triple + len(events) + np.cumsum(lengths) - lengths
+    event_movies = list(zip(event_nodes[known].tolist(), rows[known].tolist(), metadata_first.tolist()))
+    return np.column_stack([triple_ids, triples]), event_movies
+
+
+def export_chunks(engine, mapper, itid_tr, chunk_result):
+    """
+    Chunk triples with their instances as strings, and the subgraph stack of every
+    top-level chunk, from a chunking result ({triple_id: [depth, subj, prop, obj, transaction, '1']},
+    whose top-level flags are updated in place).
+    """
+    # Post processing results
+    subjects = set(v[1] for k, v in chunk_result.items())
+    objects = set(v[3] for k, v in chunk_result.items())
+
+    instance_as_chunk = []
+    for i in subjects.union(objects):
+        ref = engine.chunk_ref(i)
+        if ref is not None:
+            instance_as_chunk.append(ref)
+
+    engine.chunking_result_final = {}
+    for triple_id, triple_info in chunk_result.items():
+        if triple_id in instance_as_chunk:
+            triple_info[5] = ''
+        engine.chunking_result_final[triple_id] = triple_info
+
+    # Convert Final Result to Strings
+    final_result_export = {}
+    for tid, info in engine.chunking_result_final.items():
+        new_info = [
+            info[0],
+            engine.inst_str(info[1]),
+            mapper.get_str(info[2]),
+            engine.inst_str(info[3]),
+            info[4],
+            info[5]
+        ]
+        final_result_export[tid] = new_info
+
+    chunk_stack_list = list()
+    for triple_id, triple_info in engine.chunking_result_final.items():
+        if triple_info[5] == '1':
+            engine.chunk_stack.append(engine.ITID_Freq_depth[triple_id][0])
+            engine.chunk_stack.append(itid_tr[triple_id])
+
+            engine.find_result(triple_id)
+
+            chunk_stack_list.append(engine.chunk_stack.copy())
+            engine.chunk_stack.clear()
+
+    return final_result_export, chunk_stack_list
+
+
+def export_thresholds(engine, mapper, itid_tr, thresholds):
+    """
+    export_chunks for every threshold of a sweep, from one chunking run at the lowest threshold:
+    each threshold keeps the levels before the first one selected at a lower frequency.
+    Returns {threshold: (chunk triples, subgraph stacks)}.
+    """
+    level_freq = {int(info[0]): engine.ITID_Freq_depth[tid][0] for tid, info in engine.Chunking_Result.items()}
+    exported = {}
+    for threshold in thresholds:
+        max_level = 0
+        while max_level + 1 in level_freq and level_freq[max_level + 1] >= threshold:
+            max_level += 1
+        chunk_result = {tid: list(info) for tid, info in engine.Chunking_Result.items() if int(info[0]) <= max_level}
+        exported[threshold] = export_chunks(engine, mapper, itid_tr, chunk_result)
+    return exported
+
+
+def process_single_user(user_data, shared_state_path):
+    """
+    Mines one user, given as (user_id, start, end) rows of the mapped ratings.
+    Returns {'user_id', 'ratings', 'status', 'triples', 'subgraphs', 'metrics'}, where triples
+    and subgraphs map each mined threshold to the chunk triples and subgraph stacks of the user.
+    """
+    user_id, start, end = user_data
+    user_metrics = metrics.UserMetrics(user_id)
+    diagnostics.setup(LOG_FILE, filemode='a')  # no-op if this process is already set up
+
+    # Read-only run state, loaded once per worker process
+    shared = shared_state.attach(shared_state_path)
+    original_property_dict, original_ontology_graph, original_ontology_path_list, original_path_property_set = shared['schema']
+    movie_index = open_movie_index(shared['movie_index_dir'])
+    user_series = open_mapped_data(shared['ratings_dir']).user_frame(start, end)
     
-    # Initialize Mapper with Base State (Schema)
-    mapper = StringMapper()
-    mapper.str_to_int = base_mapper_state['str_to_int'].copy()
-    mapper.int_to_str = base_mapper_state['int_to_str'].copy()
-    mapper.counter = base_mapper_state['counter']
+    # Per-user Mapper layered over the shared base vocabulary (Schema)
+    mapper = OverlayStringMapper(shared['mapper']['str_to_int'], shared['mapper']['int_to_str'])
+
+    ratings_key = manifest.ratings_fingerprint(user_series)
+    result = {'user_id': int(user_id), 'ratings': ratings_key, 'status': 'done', 'triples': {}, 'subgraphs': {},
+              'metrics': user_metrics}
 
-    start_datetime = datetime.now()
     watched_movie_len = len(user_series)
+    user_metrics.count('events', watched_movie_len)
     print(f"User: {user_id} | Number of Watching Events: {watched_movie_len}")
 
     # Threshold Calculation
@@ -42,60 +169,42 @@ def process_single_user(user_data, schema_data, combined_metadata, base_mapper_s
         min_support = 2
     else:
         print(f"Skipping User {user_id} (Not enough data)")
-        return
+        result['status'] = 'skipped'
+        user_metrics.lap('load')
+        result['metrics'] = user_metrics.as_dict()
+        return result
 
-    print(f'threshold: {min_support}')
+    # A threshold sweep mines once at its lowest threshold: the candidates chosen do not depend on the
+    # threshold, which only stops chunking at the first level selected below it
+    thresholds = sorted(set(shared['thresholds'])) if shared['thresholds'] else [min_support]
+    min_support = thresholds[0]
+    print(f"threshold: {', '.join(map(str, thresholds))}")
 
     target_data = user_series.iloc[:-1].copy()
+    user_metrics.lap('load')
     
-    # --- Triple Generation (Vectorized & Memory-based) ---
-    total_triples = list()
-    
-    # Vectorized preparation
-    uids = target_data['userId'].astype(int).astype(str).tolist()
-    mids = target_data['tmdbId'].astype(int).astype(str).tolist()
-    
-    for uid, mid in zip(uids, mids):
-        user_node = "USER_" + uid
-        movie_node = "MOVI_" + mid
-        event_node = "U" + uid + "_M" + mid
-        
-        # Triple 1: User -> WatchingEvent
-        total_triples.append((0, "User", user_node, "UserWatching", "WatchingEvent", event_node))
-        
-        # Triple 3: WatchingEvent -> Movie
-        total_triples.append((0, "WatchingEvent", event_node, "WatchingMovie", "Movie", movie_node))
-    
-    # Metadata Logic (Optimized)
-    for uid, mid in zip(uids, mids):
-        movi_key = "MOVI_" + mid
-        if movi_key in combined_metadata:
-            total_triples.extend(combined_metadata[movi_key])
-
-    # Assign Triple IDs and Format for Engine
-    triples_for_engine = []
-    triple_no = 0
-    for t in total_triples:
-        if len(t) >= 5:
-            # Row: [id, subj_cl, subj_inst, prop, obj_cl, obj_inst] (All Strings)
-            row = [str(triple_no), t[0], t[1], t[2], t[3], t[4]]
-            triples_for_engine.append(row)
-            triple_no += 1
-
-    mid_datetime = datetime.now()
+    # --- Triple Generation (integer arrays, no per-event strings) ---
+    triples_for_engine, event_movies = expand_user_triples(user_id, target_data['tmdbId'].to_numpy(), movie_index, mapper)
+    user_metrics.count('triples', len(triples_for_engine))
+    user_metrics.lap('triple_build')
 
     # --- Run FSM for User ---
     engine = FSMEngine(mapper)
     
-    # Restore schema info
-    engine.property_dict = copy.deepcopy(original_property_dict)
+    # Restore schema info (shared, read-only: the filtering below builds new containers)
+    engine.property_dict = original_property_dict
     engine.ontology_graph = original_ontology_graph 
-    engine.ontology_path_list = copy.deepcopy(original_ontology_path_list)
-    engine.path_property_set = copy.deepcopy(original_path_property_set)
+    engine.ontology_path_list = original_ontology_path_list
+    engine.path_property_set = original_path_property_set
+    engine.option_class_ids = {mapper.get_id(c) for c in OPTION_CLASS_LIST}
 
-    # 3. Store Triples (Strings -> IDs inside)
-    start_instance_list, triple_dict, prop_triples_dict = engine.store_triples(triples_for_engine, START_CLASS)
+    # 3. Store Triples (already IDs)
+    start_instance_list, triple_dict, prop_triples_dict, triple_index = engine.store_encoded_triples(
+        triples_for_engine.tolist(), START_CLASS)
     engine.prop_triples_dict = prop_triples_dict
+    engine.triple_index = triple_index
+    user_metrics.count('start_instances', len(start_instance_list))
+    user_metrics.lap('store_triples')
 
     # Filter schema based on available data (IDs)
     prop_id_list = [property_info[1] for property_id, property_info in engine.property_dict.items()]
@@ -107,10 +216,17 @@ def process_single_user(user_data, schema_data, combined_metadata, base_mapper_s
     engine.ontology_path_list = [op for op in engine.ontology_path_list 
                                  if set(op).issubset(set(engine.property_dict.keys()))]
     engine.path_property_set = engine.path_property_set.intersection(set(engine.property_dict.keys()))
+    user_metrics.lap('schema_filter')
 
-    # 4. Triple Paths
-    triple_paths_dict = {start_instance: engine.find_triple_paths(START_CLASS, start_instance)
-                         for start_instance in start_instance_list}
+    # 4. Triple Paths (paths past each watched movie come from the worker's suffix cache where they hold)
+    movie_suffixes = None
+    cache = suffix_cache.suffix_cache(shared_state_path, SUFFIX_CACHE_MOVIES, original_property_dict,
+                                      original_ontology_path_list, mapper.get_id(START_CLASS),
+                                      mapper.get_id("Movie"), movie_index)
+    if cache is not None:
+        movie_suffixes = {event: (first_triple, cache.get(row)) for event, row, first_triple in event_movies}
+    triple_paths_dict = engine.find_all_triple_paths(START_CLASS, start_instance_list, movie_suffixes)
+    user_metrics.count('memoized_events', engine.memoized_starts)
     
     transaction_triple = {start_instance: set(sum(triple_paths, [])) 
                           for start_instance, triple_paths in triple_paths_dict.items()}
@@ -124,141 +240,222 @@ def process_single_user(user_data, schema_data, combined_metadata, base_mapper_s
     triple_dict = {tid: t for tid, t in triple_dict.items() if tid in it_trs}
             
     itid_tr = {tid: list(start_instance)[0] for tid, start_instance in it_trs.items()}
+    user_metrics.count('paths', sum(len(triple_paths) for triple_paths in triple_paths_dict.values()))
+    user_metrics.count('triples_on_paths', len(itid_tr))
+    user_metrics.lap('path_finding')
     
     # 5. Chunk Type
     engine.prop_chunk_type_dict = engine.get_chunking_type()
     
     # 6. Generate Candidates
-    it_hash = {k: v.copy() for k, v in triple_dict.items()}
+    it_hash = engine.build_it_hash(triple_dict, itid_tr)
     candi_it_tr, same_itids = engine.generate_candidate(it_hash=it_hash, itid_tr=itid_tr, threshold=min_support)
     
     # Set same code
-    same_code_number = 1
-    for tid, iso_trip_lst in same_itids.items():
-        if it_hash[tid].same_code == 0: 
-            same_code_str = f"same_{same_code_number}"
-            same_code_id = mapper.get_id(same_code_str)
-            for iso_trip in iso_trip_lst:
-                if it_hash[iso_trip].same_code == 0:
-                    it_hash[iso_trip].set_same_code(same_code_id)
-            same_code_number += 1
+    engine.assign_same_codes(it_hash, same_itids)
+    user_metrics.count('candidates', len(candi_it_tr))
+    user_metrics.lap('candidate_generation')
             
     if len(list(candi_it_tr.keys())) > 0:
         sampled_candidate = list(candi_it_tr.keys())[0]
         candidates = same_itids[sampled_candidate]
         
         engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=min_support)
+        user_metrics.chunking_levels = engine.level_seconds
+        user_metrics.count('chunked_triples', len(engine.Chunking_Result))
+        user_metrics.count('max_depth', max(int(info[0]) for info in engine.Chunking_Result.values()))
+        user_metrics.lap('chunking')
         
-        # Post processing results
-        subjects = set(v[1] for k, v in engine.Chunking_Result.items())
-        objects = set(v[3] for k, v in engine.Chunking_Result.items())
-        
-        instance_as_chunk = []
-        for i in subjects.union(objects):
-            s = mapper.get_str(i)
-            if s.isdigit():
-                instance_as_chunk.append(i)
-        
-        for triple_id, triple_info in engine.Chunking_Result.items():
-            if triple_id in instance_as_chunk:
-                triple_info[5] = '' 
-                engine.chunking_result_final[triple_id] = triple_info
-            else:
-                engine.chunking_result_final[triple_id] = triple_info
-        
-        # Convert Final Result to Strings
-        final_result_export = {}
-        for tid, info in engine.chunking_result_final.items():
-            new_info = [
-                info[0],
-                mapper.get_str(info[1]),
-                mapper.get_str(info[2]),
-                mapper.get_str(info[3]),
-                info[4], 
-                info[5]
-            ]
-            final_result_export[tid] = new_info
-
-        chunk_stack_list = list()
-        for triple_id, triple_info in engine.chunking_result_final.items():
-            if triple_info[5] == '1':
-                engine.chunk_stack.append(engine.ITID_Freq_depth[triple_id][0])
-                engine.chunk_stack.append(itid_tr[triple_id])
-                
-                engine.find_result(triple_id)
-                
-                chunk_stack_list.append(engine.chunk_stack.copy())
-                engine.chunk_stack.clear()
-                
-        # Save Results
-        with open(f'{SUBGRAPHS_FOLDER}/{user_id}_triples_in_subgraphs.pkl', 'wb') as f:
-            pickle.dump(final_result_export, f)
-        with open(f'{SUBGRAPHS_FOLDER}/{user_id}_subgraphs.pkl', 'wb') as f:
-            pickle.dump(chunk_stack_list, f)
-            
-    end_datetime = datetime.now()
-    print(f'User {user_id} - Triple Collection: {(mid_datetime - start_datetime).seconds}s, Subgraph Mining: {(end_datetime - mid_datetime).seconds}s')
+        subgraph_count = 0
+        for threshold, (triples, subgraphs) in export_thresholds(engine, mapper, itid_tr, thresholds).items():
+            result['triples'][threshold], result['subgraphs'][threshold] = triples, subgraphs
+            subgraph_count += len(subgraphs)
+        user_metrics.count('subgraphs', subgraph_count)
+        user_metrics.lap('export')
+
+    print(f'User {user_id} - {user_metrics.line()}')
+    result['metrics'] = user_metrics.as_dict()
+    return result
+
+
+def process_user_batch(user_batch, shared_state_path):
+    """Mines a batch of users and appends their results to the result store as one part per table."""
+    batch_start = time.perf_counter()
+    shared = shared_state.attach(shared_state_path)
+    profile = shared['profile']
+
+    user_results = []
+    profiles = []
+    for user_data in user_batch:
+        if profile is not None and user_data[0] in profile['users']:
+            result, path = profiling.profile_call(profile, user_data[0], process_single_user, user_data,
+                                                  shared_state_path)
+            user_results.append(result)
+            profiles.append(path)
+        else:
+            user_results.append(process_single_user(user_data, shared_state_path))
+    outputs = results.write_results(user_results)
 
+    # Recorded only after the parts are in place, so a crash never marks a user finished
+    for result in user_results:
+        user_outputs = outputs if result['status'] == 'done' else []
+        manifest.record_user(result['user_id'], result['ratings'], shared['run_fingerprint'], result['status'],
+                             user_outputs, path=shared['manifest_file'])
+    stats = scheduling.batch_stats(len(user_results), time.perf_counter() - batch_start)
+    stats['metrics'] = [result['metrics'] for result in user_results]
+    stats['profiles'] = profiles
+    return stats
 
-def run_pipeline(max_users=None):
+
+def pending_users(mapped_ml_1m, order, completed, run_key, only_changed=False, counts=None):
+    """
+    Yields (user_id, start, end) row slices of the users at the given indices, in that order,
+    leaving out users the manifest records as finished with the same inputs.
+    """
+    user_ids, offsets = mapped_ml_1m.user_ids, mapped_ml_1m.offsets
+    for i in order.tolist():
+        user_id, start, end = int(user_ids[i]), int(offsets[i]), int(offsets[i + 1])
+        entry = completed.get(user_id)
+        if entry is not None and manifest.is_complete(
+                entry, manifest.ratings_fingerprint(mapped_ml_1m.user_frame(start, end)), run_key, only_changed):
+            if counts is not None:
+                counts['skipped'] += 1
+            continue
+        yield user_id, start, end
+
+
+def pending_work(mapped_ml_1m, order, completed, run_key, cost_of, only_changed=False, counts=None):
+    """
+    The users to mine, streamed by pending_users, and an estimate of their total cost that reads
+    no ratings: every user in order less those the manifest records as finished for this run.
+    Skipped users are left out of the total, so guided batch sizes follow the work actually
+    pending. A recorded user whose ratings or outputs changed is mined but not counted, which
+    only makes the batches shrink a little early.
+    """
+    pending_cost = sum(cost_of[user_id] for user_id in mapped_ml_1m.user_ids[order].tolist()
+                       if not manifest.is_recorded(completed.get(user_id), run_key, only_changed))
+    return pending_users(mapped_ml_1m, order, completed, run_key, only_changed, counts), pending_cost
+
+
+def run_pipeline(max_users=None, resume=True, only_changed=False, executor=EXECUTOR, n_jobs=N_JOBS, shard=None,
+                 thresholds=THRESHOLDS):
+    """
+    resume: skip users the manifest records as finished with unchanged inputs.
+    only_changed: re-mine only users whose ratings changed since the last manifest.
+    executor: 'serial', 'thread' or 'process' (see executors.py); n_jobs: its workers.
+    shard: (i, N) to mine only the users with user_id % N == i, recording them in the
+           shard's own manifest (combine with manifest.merge_shard_manifests afterwards).
+    thresholds: min_support values to mine every user at in one pass, written tagged by threshold;
+                None uses the per-user threshold from the event count.
+    """
     # Setup folders
     if not os.path.exists(TRAINING_FOLDER):
         os.makedirs(TRAINING_FOLDER)
     if not os.path.exists(SUBGRAPHS_FOLDER):
         os.makedirs(SUBGRAPHS_FOLDER)
     
-    # Logging Setup
-    logging.basicConfig(filename='fsm_run.log', format='%(message)s', filemode='w', level=logging.INFO)
+    manifest_file = manifest.MANIFEST_FILE if shard is None else manifest.shard_manifest_file(shard)
+    if not resume and not only_changed:
+        manifest.reset_manifest(manifest_file)
+
+    # Logging Setup (shards running side by side share the log)
+    diagnostics.setup(LOG_FILE, filemode='w' if shard is None else 'a')
 
     # 1. Load Data
     mapped_ml_1m = load_mapped_data()
-    metadata_dicts = load_metadata_triples()
-
-    # Pre-process Metadata: Flatten to {movi_key: [all_triples]}
-    print("Flattening metadata for fast lookup...")
-    combined_metadata = defaultdict(list)
-    # Ensure stable order of types
-    for meta_type, meta_dict in metadata_dicts.items():
-        for movi_key, triples in meta_dict.items():
-            combined_metadata[movi_key].extend(triples)
-    
-    # 2. Schema Loading (Once) with Global Mapper
-    print("Loading schema...")
-    global_mapper = StringMapper()
-    engine = FSMEngine(global_mapper)
-    property_dict, ontology_graph, class_dict = engine.load_schema(SCHEMA_FILE)
-    
-    print("Finding ontology paths...")
-    ontology_path_list, path_property_set = engine.find_ontology_paths(
-        START_CLASS, END_CLASS_LIST, ontology_graph, MAX_DEPTH
-    )
-    
-    # Pack schema data (IDs) to pass to workers
-    schema_data = (property_dict, ontology_graph, ontology_path_list, path_property_set)
+
+    # 2. Vocabulary (Schema + Metadata terms) and movie -> metadata triples index, both prebuilt
+    global_mapper, movie_index = load_or_build_index()
+
+    # 3. Schema and its ontology paths, compiled once and reused while the schema and the path parameters hold
+    schema = load_or_compile_schema(global_mapper)
+    property_dict, ontology_graph = schema['property_dict'], schema['ontology_graph']
+    ontology_path_list, path_property_set = schema['ontology_path_list'], schema['path_property_set']
     
-    # Pack Mapper State
-    base_mapper_state = {
-        'str_to_int': global_mapper.str_to_int,
-        'int_to_str': global_mapper.int_to_str,
-        'counter': global_mapper.counter
-    }
+    # Inputs shared by every user: schema and metadata contents, and mining parameters
+    thresholds = sorted(set(thresholds)) if thresholds else None
+    run_key = content_fingerprint([SCHEMA_FILE] + metadata_paths(), START_CLASS, END_CLASS_LIST, OPTION_CLASS_LIST,
+                                  MAX_DEPTH, RECENT, thresholds)
+
+    # Most expensive users first (estimated from their expanded triple count), so no core
+    # is left with a long user at the end of the run
+    costs = scheduling.estimate_costs(mapped_ml_1m, movie_index)
+    order = scheduling.longest_first(mapped_ml_1m, costs, max_users)
+    if shard is not None:
+        order = order[executors.in_shard(mapped_ml_1m.user_ids[order], shard)]
+        print(f"Shard {shard[0]}/{shard[1]}: {len(order)} users")
+
+    # Profiling: the selected users plus the most expensive ones of this run
+    profile = profiling.settings()
+    if profile is not None:
+        profile['users'] |= set(mapped_ml_1m.user_ids[order[:profile['slowest']]].tolist())
+        print(f"Profiling {len(profile['users'])} users ({profile['mode']}) into {profile['dir']}")
+
+    # Publish read-only schema data (IDs), base mapper state and data locations once for all workers
+    shared_state_path = shared_state.publish({
+        'schema': (property_dict, ontology_graph, ontology_path_list, path_property_set),
+        'mapper': {
+            'str_to_int': global_mapper.str_to_int,
+            'int_to_str': global_mapper.int_to_str
+        },
+        'movie_index_dir': movie_index.directory,
+        'ratings_dir': mapped_ml_1m.directory,
+        'run_fingerprint': run_key,
+        'thresholds': thresholds,
+        'manifest_file': manifest_file,
+        'profile': profile
+    })
 
     print("Starting user processing...")
     
-    # Prepare User Groups
-    user_groups = []
-    for user_id, user_series in mapped_ml_1m.groupby('userId'):
-        if max_users is not None and int(user_id) > max_users:
-            break
-        user_groups.append((user_id, user_series))
-        
+    # Users are read from the mapped ratings as row slices: only the batches in flight hold user data
+    completed = {}
+    if resume or only_changed:
+        completed = manifest.load_manifest()
+        if shard is not None:
+            completed.update(manifest.load_manifest(manifest_file))
+    counts = Counter()
+    cost_of = dict(zip(mapped_ml_1m.user_ids.tolist(), costs.tolist()))
+    # Users are checked against the manifest as they are batched, so the first batch goes out right away
+    users, pending_cost = pending_work(mapped_ml_1m, order, completed, run_key, cost_of, only_changed, counts)
+
     # Parallel Execution
-    n_jobs = max(1, cpu_count() - 1)
-    print(f"Running on {n_jobs} cores...")
-    
-    Parallel(n_jobs=n_jobs)(
-        delayed(process_single_user)(user_group, schema_data, combined_metadata, base_mapper_state) 
-        for user_group in user_groups
-    )
+    n_jobs = 1 if executor == 'serial' else (n_jobs or executors.default_jobs())
+    print(f"Running on {n_jobs} {executor} workers...")
     
+    # Batches of up to RESULT_BATCH_USERS users whose estimated cost shrinks as the run goes on
+    user_batches = scheduling.guided_batches(users, cost_of, pending_cost, n_jobs, RESULT_BATCH_USERS)
+    utilization = scheduling.Utilization()
+    summary_file, user_metrics_file = RUN_SUMMARY_FILE, USER_METRICS_FILE
+    if shard is not None:
+        summary_file = executors.shard_path(summary_file, shard)
+        user_metrics_file = executors.shard_path(user_metrics_file, shard)
+    summary = metrics.RunSummary(user_metrics_file)
+    mined = 0
+    profiles = []
+    try:
+        # Submission stops IN_FLIGHT_PER_WORKER batches per worker ahead; results arrive as batches finish
+        finished = executors.run_tasks(executor, process_user_batch, user_batches, n_jobs, IN_FLIGHT_PER_WORKER,
+                                       shared_state_path)
+        for stats in finished:
+            utilization.add(stats)
+            for user_metrics in stats['metrics']:
+                summary.add(user_metrics)
+            profiles.extend(stats['profiles'])
+            mined += stats['users']
+            print(f"Mined {mined} users")
+    finally:
+        shared_state.release(shared_state_path)
+
+    if counts['skipped']:
+        print(f"Skipped {counts['skipped']} users already completed with unchanged inputs")
+
+    utilization.report()
+    summary.write(summary_file, wall=utilization.wall(), executor=executor, n_jobs=n_jobs,
+                  shard=list(shard) if shard is not None else None, workers=utilization.as_dict())
+    print(f"Run summary written to {summary_file}")
+    if profile is not None:
+        merged = profiling.merge_profiles(profile, profiles)
+        if merged is not None:
+            print(f"Merged profiles written to {merged}")
     print("Pipeline completed.")
@@ -0,0 +1,121 @@
+import os
+import sys
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from .config import PROFILE_MODE, PROFILE_USERS, PROFILE_SLOWEST, PROFILE_DIR, PROFILE_INTERVAL
+
+# Profiles are written per user to PROFILE_DIR:
+#   cprofile: user_<id>.prof (pstats), merged into merged.prof
+#   sampling: user_<id>.collapsed (one 'frame;frame;... count' line per stack, the input
+#             format of flamegraph.pl / speedscope), merged into merged.collapsed
+PROFILE_MODES = ('cprofile', 'sampling')
+_EXTENSIONS = {'cprofile': '.prof', 'sampling': '.collapsed'}
+
+
+def settings():
+    """
+    Profiling settings from config, overridden by FSM_PROFILE (mode), FSM_PROFILE_USERS
+    (comma-separated user IDs) and FSM_PROFILE_SLOWEST (N). Returns None when profiling is off.
+    """
+    mode = os.environ.get('FSM_PROFILE', PROFILE_MODE) or None
+    if mode is None:
+        return None
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+
+    users = PROFILE_USERS
+    if os.environ.get('FSM_PROFILE_USERS'):
+        users = [int(user_id) for user_id in os.environ['FSM_PROFILE_USERS'].split(',')]
+    slowest = int(os.environ.get('FSM_PROFILE_SLOWEST', PROFILE_SLOWEST))
+    return {'mode': mode, 'users': set(users), 'slowest': slowest, 'dir': PROFILE_DIR, 'interval': PROFILE_INTERVAL}
+
+
+def profile_file(profile, user_id):
+    return os.path.join(profile['dir'], f"user_{user_id}{_EXTENSIONS[profile['mode']]}")
+
+
+class StackSampler:
+    """Records the stack of one thread every interval seconds, from a helper thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.target = threading.get_ident()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.items():
+                f.write(f'{stack} {count}\n')
+
+
+def profile_call(profile, user_id, function, *args):
+    """
+    Runs function(*args) under the configured profiler and writes the user's profile.
+    Returns (function result, path of the profile written).
+    """
+    os.makedirs(profile['dir'], exist_ok=True)
+    path = profile_file(profile, user_id)
+
+    if profile['mode'] == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args), path
+        finally:
+            profiler.dump_stats(path)
+
+    sampler = StackSampler(profile['interval'])
+    sampler.start()
+    try:
+        return function(*args), path
+    finally:
+        sampler.stop()
+        sampler.write(path)
+
+
+def merge_profiles(profile, paths):
+    """
+    Merges the per-user profiles at paths, the ones profile_call wrote in this run (files left
+    from earlier runs are not included). Returns the merged file, or None if there were none.
+    """
+    paths = sorted(paths)
+    if not paths:
+        return None
+    merged = os.path.join(profile['dir'], f"merged{_EXTENSIONS[profile['mode']]}")
+
+    if profile['mode'] == 'cprofile':
+        stats = pstats.Stats(*paths)
+        stats.dump_stats(merged)
+        return merged
+
+    stacks = Counter()
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                stack, count = line.rstrip('\n').rsplit(' ', 1)
+                stacks[stack] += int(count)
+    with open(merged, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return merged
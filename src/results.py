@@ -0,0 +1,172 @@
+import os
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .config import RESULTS_DIR, SUBGRAPHS_FOLDER
+
+# Append-only Parquet dataset with one directory per table. Every batch of users
+# becomes one part file per table, tagged with the time it was written; a user that
+# is mined again is read from its latest batch only. Triples and subgraphs carry the
+# min_support threshold they were mined at (one per user unless a threshold sweep ran).
+USERS_TABLE = 'users'
+TRIPLES_TABLE = 'triples'
+SUBGRAPHS_TABLE = 'subgraphs'
+
+USERS_SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('written_at', pa.int64()),
+    ('status', pa.string()),
+])
+TRIPLES_SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('written_at', pa.int64()),
+    ('threshold', pa.int32()),
+    ('triple_id', pa.int64()),
+    ('depth', pa.int32()),
+    ('subject', pa.string()),
+    ('property', pa.string()),
+    ('object', pa.string()),
+    ('transaction', pa.int64()),
+    ('top_level', pa.bool_()),
+])
+SUBGRAPHS_SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('written_at', pa.int64()),
+    ('threshold', pa.int32()),
+    ('subgraph_no', pa.int32()),
+    ('frequency', pa.int64()),
+    ('transaction', pa.int64()),
+    ('triple_ids', pa.list_(pa.int64())),
+])
+
+
+def _write_part(table_name, schema, columns, part_name, directory):
+    table_dir = os.path.join(directory, table_name)
+    os.makedirs(table_dir, exist_ok=True)
+    path = os.path.join(table_dir, part_name)
+    pq.write_table(pa.Table.from_pydict(columns, schema=schema), path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return os.path.relpath(path, SUBGRAPHS_FOLDER)
+
+
+def write_results(results, directory=RESULTS_DIR):
+    """
+    Writes one batch of user results (dicts from process_single_user) as one part file
+    per table. Returns the written part paths, relative to SUBGRAPHS_FOLDER.
+    """
+    written_at = time.time_ns()
+    # Unique across threads, processes and shard hosts writing to the same directory
+    part_name = f'part-{written_at}-{uuid.uuid4().hex}.parquet'
+
+    users = {name: [] for name in USERS_SCHEMA.names}
+    triples = {name: [] for name in TRIPLES_SCHEMA.names}
+    subgraphs = {name: [] for name in SUBGRAPHS_SCHEMA.names}
+
+    for result in results:
+        user_id = int(result['user_id'])
+        users['user_id'].append(user_id)
+        users['written_at'].append(written_at)
+        users['status'].append(result['status'])
+
+        for threshold, user_triples in result['triples'].items():
+            for tid, info in user_triples.items():
+                triples['user_id'].append(user_id)
+                triples['written_at'].append(written_at)
+                triples['threshold'].append(int(threshold))
+                triples['triple_id'].append(int(tid))
+                triples['depth'].append(int(info[0]))
+                triples['subject'].append(info[1])
+                triples['property'].append(info[2])
+                triples['object'].append(info[3])
+                triples['transaction'].append(int(info[4]))
+                triples['top_level'].append(info[5] == '1')
+
+        for threshold, user_subgraphs in result['subgraphs'].items():
+            for subgraph_no, chunk_stack in enumerate(user_subgraphs):
+                subgraphs['user_id'].append(user_id)
+                subgraphs['written_at'].append(written_at)
+                subgraphs['threshold'].append(int(threshold))
+                subgraphs['subgraph_no'].append(subgraph_no)
+                subgraphs['frequency'].append(int(chunk_stack[0]))
+                subgraphs['transaction'].append(int(chunk_stack[1]))
+                subgraphs['triple_ids'].append([int(tid) for tid in chunk_stack[2:]])
+
+    parts = []
+    if triples['user_id']:
+        parts.append(_write_part(TRIPLES_TABLE, TRIPLES_SCHEMA, triples, part_name, directory))
+    if subgraphs['user_id']:
+        parts.append(_write_part(SUBGRAPHS_TABLE, SUBGRAPHS_SCHEMA, subgraphs, part_name, directory))
+    # Written last: a batch only counts once its users row exists
+    if users['user_id']:
+        parts.append(_write_part(USERS_TABLE, USERS_SCHEMA, users, part_name, directory))
+    return parts
+
+
+def _read(table_name, user_ids, depths, columns, directory, schema=None, thresholds=None):
+    table_dir = os.path.join(directory, table_name)
+    if not os.path.isdir(table_dir):
+        return None
+    # With the table schema, parts written before a column existed read it as null
+    dataset = ds.dataset(table_dir, format='parquet', schema=schema)
+
+    condition = None
+    if user_ids is not None:
+        condition = ds.field('user_id').isin([int(u) for u in user_ids])
+    if depths is not None:
+        depth_condition = ds.field('depth').isin([int(d) for d in depths])
+        condition = depth_condition if condition is None else condition & depth_condition
+    if thresholds is not None:
+        threshold_condition = ds.field('threshold').isin([int(t) for t in thresholds])
+        condition = threshold_condition if condition is None else condition & threshold_condition
+
+    if columns is not None:
+        columns = list(dict.fromkeys(['user_id', 'written_at'] + list(columns)))
+    return dataset.to_table(filter=condition, columns=columns).to_pandas()
+
+
+def _latest_only(frame, user_ids, directory):
+    """Keeps each user's rows from the batch that last wrote that user."""
+    users = _read(USERS_TABLE, user_ids, None, ['written_at'], directory)
+    if users is None or frame is None:
+        return frame
+    latest = users.groupby('user_id', as_index=False)['written_at'].max()
+    return frame.merge(latest, on=['user_id', 'written_at']).reset_index(drop=True)
+
+
+def read_triples(user_ids=None, depths=None, columns=None, directory=RESULTS_DIR, thresholds=None):
+    """Chunk triples as a DataFrame, filtered by user, depth and/or threshold at scan time."""
+    frame = _read(TRIPLES_TABLE, user_ids, depths, columns, directory, TRIPLES_SCHEMA, thresholds)
+    return _latest_only(frame, user_ids, directory)
+
+
+def read_subgraphs(user_ids=None, columns=None, directory=RESULTS_DIR, thresholds=None):
+    """Subgraphs (frequency, transaction, triple IDs) as a DataFrame, filtered by user and/or threshold at scan time."""
+    frame = _read(SUBGRAPHS_TABLE, user_ids, None, columns, directory, SUBGRAPHS_SCHEMA, thresholds)
+    return _latest_only(frame, user_ids, directory)
+
+
+def load_user_results(user_id, directory=RESULTS_DIR, threshold=None):
+    """
+    One user's results in the structures the per-user pickles used to hold:
+    ({triple_id: [depth, subject, property, object, transaction, '1' or '']},
+     [[frequency, transaction, triple_id, ...], ...])
+    After a threshold sweep, pass the threshold to read.
+    """
+    thresholds = None if threshold is None else [threshold]
+    triples = read_triples(user_ids=[user_id], directory=directory, thresholds=thresholds)
+    subgraphs = read_subgraphs(user_ids=[user_id], directory=directory, thresholds=thresholds)
+
+    final_result_export = {}
+    if triples is not None:
+        for row in triples.itertuples(index=False):
+            final_result_export[row.triple_id] = [str(row.depth), row.subject, row.property, row.object,
+                                                  row.transaction, '1' if row.top_level else '']
+
+    chunk_stack_list = []
+    if subgraphs is not None:
+        for row in subgraphs.sort_values('subgraph_no').itertuples(index=False):
+            chunk_stack_list.append([row.frequency, row.transaction] + row.triple_ids.tolist())
+
+    return final_result_export, chunk_stack_list
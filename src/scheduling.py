@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from .data_loader import RATINGS_CHUNK_ROWS
+
+# Guided self-scheduling: each new batch takes 1 / (GUIDED_SPLIT * n_jobs) of the estimated
+# cost still to dispatch, so batches start large and shrink towards single users at the tail.
+GUIDED_SPLIT = 2
+
+
+def estimate_costs(mapped_ml_1m, movie_index, chunk_rows=RATINGS_CHUNK_ROWS):
+    """
+    Estimated mining cost of every user (aligned with mapped_ml_1m.user_ids): the number of
+    triples the user expands to, two per watching event plus the metadata triples of the
+    watched movie. The last rating is held out of mining and is not counted.
+    """
+    triples_per_movie = np.diff(np.asarray(movie_index.offsets))
+    offsets = mapped_ml_1m.offsets
+    tmdb_column = mapped_ml_1m.columns['tmdbId']
+
+    def row_costs(tmdb_ids):
+        rows = movie_index.rows(tmdb_ids)
+        metadata = triples_per_movie[rows] if len(triples_per_movie) else np.zeros(len(rows), dtype=np.int64)
+        return 2 + np.where(rows >= 0, metadata, 0)
+
+    costs = np.zeros(len(mapped_ml_1m), dtype=np.int64)
+    for lo in range(0, len(tmdb_column), chunk_rows):
+        cost = row_costs(np.asarray(tmdb_column[lo:lo + chunk_rows]))
+        users = np.searchsorted(offsets, np.arange(lo, lo + len(cost)), side='right') - 1
+        first = users[0]
+        costs[first:users[-1] + 1] += np.bincount(users - first, weights=cost).astype(np.int64)
+
+    if len(costs):
+        costs -= row_costs(np.asarray(tmdb_column[offsets[1:] - 1]))
+    return costs
+
+
+def longest_first(mapped_ml_1m, costs, max_users=None):
+    """Indices of the users to consider (user ID up to max_users), most expensive first."""
+    count = len(mapped_ml_1m)
+    if max_users is not None:
+        count = int(np.searchsorted(mapped_ml_1m.user_ids, max_users, side='right'))
+    return np.argsort(-costs[:count], kind='stable')
+
+
+def guided_batches(users, cost_of, total_cost, n_jobs, max_batch_users):
+    """Groups (user_id, start, end) items into batches of shrinking estimated cost."""
+    remaining = total_cost
+    batch, batch_cost, target = [], 0, 0
+    for user in users:
+        if not batch:
+            target = remaining / (GUIDED_SPLIT * n_jobs)
+        cost = cost_of[user[0]]
+        batch.append(user)
+        batch_cost += cost
+        remaining -= cost
+        if batch_cost >= target or len(batch) == max_batch_users:
+            yield batch
+            batch, batch_cost = [], 0
+    if batch:
+        yield batch
+
+
+class Utilization:
+    """Busy time per worker process, reported against the wall time of the run."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.workers = defaultdict(lambda: {'batches': 0, 'users': 0, 'busy': 0.0})
+
+    def add(self, batch_stats):
+        worker = self.workers[batch_stats['worker']]
+        worker['batches'] += 1
+        worker['users'] += batch_stats['users']
+        worker['busy'] += batch_stats['busy']
+
+    def wall(self):
+        return time.perf_counter() - self.start
+
+    def as_dict(self):
+        wall = self.wall()
+        return {str(worker_id): dict(worker, utilization=worker['busy'] / wall if wall > 0 else 0.0)
+                for worker_id, worker in sorted(self.workers.items())}
+
+    def report(self):
+        wall = self.wall()
+        print(f"Worker utilization over {wall:.1f}s:")
+        for worker_id, worker in sorted(self.workers.items()):
+            share = worker['busy'] / wall * 100 if wall > 0 else 0.0
+            print(f"  worker {worker_id}: {worker['batches']} batches, {worker['users']} users, "
+                  f"busy {worker['busy']:.1f}s ({share:.0f}%)")
+
+
+def batch_stats(users, busy):
+    # Native thread ID: the pid for process workers, distinct per thread for thread workers
+    return {'worker': threading.get_native_id(), 'users': users, 'busy': busy}
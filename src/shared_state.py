@@ -0,0 +1,35 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+# Per-process cache: path -> state. Workers attach once and reuse it for every user.
+_attached = {}
+
+SHARED_STATE_FILE = 'shared_state.pkl'
+
+
+def publish(state):
+    """
+    Writes the read-only run state (schema, base vocabulary, data locations) once to a
+    run-scoped file. Tasks then only carry its path instead of the state itself.
+    """
+    directory = tempfile.mkdtemp(prefix='fsm_shared_')
+    path = os.path.join(directory, SHARED_STATE_FILE)
+    with open(path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    _attached[path] = state
+    return path
+
+
+def attach(path):
+    """Returns the published state, loading it at most once per process. Callers must not mutate it."""
+    if path not in _attached:
+        with open(path, 'rb') as f:
+            _attached[path] = pickle.load(f)
+    return _attached[path]
+
+
+def release(path):
+    _attached.pop(path, None)
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from .fsm import FSMEngine
+from .utils import Triple
+
+_caches = {}  # run state path -> SuffixCache, per process
+_caches_lock = threading.Lock()
+
+
+class MovieSuffixes:
+    """
+    Triple paths of one movie past the hop from the start class, over the movie's own
+    metadata triples (triple IDs are positions in its movie index rows).
+    paths: {ontology path: [suffix paths]}; lookups: {triple_index key: triples found}.
+    """
+    __slots__ = ('movie_inst', 'paths', 'lookups')
+
+    def __init__(self, movie_inst, paths, lookups):
+        self.movie_inst = movie_inst
+        self.paths = paths
+        self.lookups = lookups
+
+
+def movie_suffixes(property_dict, ontology_path_list, start_cl, movie_cl, movie_inst, movie_triples):
+    """Walks the ontology paths that start with a start class -> movie class hop from one movie."""
+    hop_paths = [tuple(ont_path) for ont_path in ontology_path_list
+                 if {property_dict[ont_path[0]][0], property_dict[ont_path[0]][2]} == {start_cl, movie_cl}]
+
+    triple_index = {}
+    for pos, (subj_cl, subj_inst, prop, obj_cl, obj_inst) in enumerate(movie_triples.tolist()):
+        triple = Triple(pos, subj_cl, subj_inst, prop, obj_cl, obj_inst)
+        for key in FSMEngine.index_keys(subj_cl, subj_inst, prop, obj_cl, obj_inst):
+            triple_index.setdefault(key, []).append(triple)
+
+    path_buckets = {movie_inst: [[] for _ in hop_paths]}
+    lookups = {}
+    suffix_list = [ont_path[1:] for ont_path in hop_paths]
+    FSMEngine.walk_path_trie([(FSMEngine.build_path_trie(suffix_list), movie_cl, [(movie_inst, movie_inst, [])])],
+                             property_dict, triple_index, path_buckets, lookups=lookups)
+
+    # A path that is only the hop has the empty suffix
+    paths = {ont_path: ([[]] if len(ont_path) == 1 else bucket)
+             for ont_path, bucket in zip(hop_paths, path_buckets[movie_inst])}
+    return MovieSuffixes(movie_inst, paths, lookups)
+
+
+class SuffixCache:
+    """Bounded LRU of movie index row -> MovieSuffixes, shared by the users a worker mines."""
+
+    def __init__(self, capacity, compute):
+        self.capacity = capacity
+        self.compute = compute
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, row):
+        with self.lock:
+            entry = self.entries.get(row)
+            if entry is not None:
+                self.entries.move_to_end(row)
+                self.hits += 1
+                return entry
+        entry = self.compute(row)
+        with self.lock:
+            self.misses += 1
+            self.entries[row] = entry
+            self.entries.move_to_end(row)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return entry
+
+
+def suffix_cache(name, capacity, property_dict, ontology_path_list, start_cl, movie_cl, movie_index):
+    """The process's cache for one run (name), created on first use; None when capacity is 0."""
+    if not capacity:
+        return None
+    with _caches_lock:
+        if name not in _caches:
+            def compute(row):
+                movie_triples = movie_index.triples[movie_index.offsets[row]:movie_index.offsets[row + 1]]
+                return movie_suffixes(property_dict, ontology_path_list, start_cl, movie_cl,
+                                      int(movie_index.nodes[row]), movie_triples)
+            _caches[name] = SuffixCache(capacity, compute)
+        return _caches[name]
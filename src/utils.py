@@ -1,4 +1,6 @@
-import logging
+import hashlib
+import os
+from .diagnostics import log_data  # re-exported for existing callers
 
 class Triple:
     """ 
@@ -64,8 +66,48 @@ class Triple:
 class CustomError(Exception):
     pass
 
-def log_data(var_name, data):
-    logging.info(var_name)
-    # Logging complex structures with IDs might be unreadable without mapping back,
-    # but for performance logs we keep it simple or convert if necessary.
-    logging.info(str(data))
+def fingerprint(paths, *extra):
+    """
+    Stat-based key for cache invalidation: name, size and mtime of each source file
+    (missing files included as such) plus any extra values. File contents are not read,
+    so an edit that keeps size and mtime goes unnoticed; use content_fingerprint for that.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            h.update(f'{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};'.encode())
+        else:
+            h.update(f'{os.path.basename(path)}:missing;'.encode())
+    for value in extra:
+        h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+_digests = {}  # (path, inode, size, mtime) -> sha1 of the file, per process
+
+
+def file_digest(path):
+    """sha1 of a file's bytes, read in blocks. A file is read once per process while its stat is unchanged."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_ino, st.st_size, st.st_mtime_ns)
+    if key not in _digests:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _digests[key] = h.digest()
+    return _digests[key]
+
+
+def content_fingerprint(paths, *extra):
+    """Key over the bytes of each source file (missing files included as such) plus any extra values."""
+    h = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            h.update(file_digest(path))
+        else:
+            h.update(f'{os.path.basename(path)}:missing;'.encode())
+    for value in extra:
+        h.update(repr(value).encode())
+    return h.hexdigest()
@@ -0,0 +1,101 @@
+import os
+import struct
+from array import array
+from .config import VOCAB_FILE, SCHEMA_FILE, START_CLASS, END_CLASS_LIST, OPTION_CLASS_LIST
+from .data_loader import metadata_paths
+from .mapper import StringMapper
+from .utils import content_fingerprint
+
+# File layout: magic, version, fingerprint, count, offsets (count + 1, uint64), utf-8 blob.
+# The string at position i has ID i + 1 (ID 0 is reserved as in StringMapper).
+VOCAB_MAGIC = b'FSMV'
+VOCAB_VERSION = 1
+_HEADER = struct.Struct('<4sI40sQ')
+
+
+def vocabulary_fingerprint(schema_file=SCHEMA_FILE):
+    """Key of the vocabulary and the movie index: the bytes of the schema and metadata files they are built from."""
+    return content_fingerprint([schema_file] + metadata_paths(),
+                       VOCAB_VERSION, START_CLASS, END_CLASS_LIST, OPTION_CLASS_LIST)
+
+
+def build_vocabulary(metadata_dicts, schema_file=SCHEMA_FILE):
+    """
+    Interns every schema term and every metadata string up front.
+    Schema terms come first, in load_schema order, so class and property IDs
+    are the same as with a schema-only mapper.
+    """
+    mapper = StringMapper()
+    with open(schema_file, 'r') as f:
+        while True:
+            line = f.readline().rstrip()
+            if not line:
+                break
+            for term in line.split('^'):
+                mapper.get_id(term)
+
+    for cl in OPTION_CLASS_LIST + [START_CLASS] + END_CLASS_LIST:
+        mapper.get_id(cl)
+
+    for meta_dict in metadata_dicts.values():
+        for movi_key, triples in meta_dict.items():
+            mapper.get_id(str(movi_key))
+            for t in triples:
+                for term in t[:5]:
+                    mapper.get_id(str(term))
+    return mapper
+
+
+def save_vocabulary(mapper, key, path=VOCAB_FILE):
+    strings = mapper.int_to_str[1:]
+    blob = bytearray()
+    offsets = array('Q', [0])
+    for s in strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(VOCAB_MAGIC, VOCAB_VERSION, key.encode('ascii'), len(strings)))
+        offsets.tofile(f)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def load_vocabulary(path=VOCAB_FILE):
+    """Returns (fingerprint, mapper), or (None, None) if the file is missing or from another version."""
+    if not os.path.exists(path):
+        return None, None
+
+    with open(path, 'rb') as f:
+        magic, version, key, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != VOCAB_MAGIC or version != VOCAB_VERSION:
+            return None, None
+        offsets = array('Q')
+        offsets.fromfile(f, count + 1)
+        blob = f.read()
+
+    mapper = StringMapper()
+    for i in range(count):
+        mapper.int_to_str.append(blob[offsets[i]:offsets[i + 1]].decode('utf-8'))
+    mapper.str_to_int = {s: idx for idx, s in enumerate(mapper.int_to_str) if idx > 0}
+    mapper.counter = count
+    return key.decode('ascii'), mapper
+
+
+def encode_metadata(metadata_dicts, mapper):
+    """
+    Flattens metadata to {movi_key: [(subj_cl, subj_inst, prop, obj_cl, obj_inst), ...]}
+    with every term already encoded as an integer ID.
+    """
+    str_to_int = mapper.str_to_int
+    combined_metadata = {}
+    # Ensure stable order of types
+    for meta_dict in metadata_dicts.values():
+        for movi_key, triples in meta_dict.items():
+            encoded = combined_metadata.setdefault(str(movi_key), [])
+            for t in triples:
+                if len(t) >= 5:
+                    encoded.append(tuple(str_to_int[str(term)] for term in t[:5]))
+    return combined_metadata
@@ -0,0 +1,18 @@
+from src.pipeline import export_chunks
+
+
+def mine(workload):
+    """Chunk triples and subgraphs of a synthetic user."""
+    engine, it_hash, itid_tr, candidates = workload.with_candidates()
+    if candidates is None:
+        return {}, []
+    engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=workload.threshold)
+    chunk_result = {tid: list(info) for tid, info in engine.Chunking_Result.items()}
+    return export_chunks(engine, engine.mapper, itid_tr, chunk_result)
+
+
+def test_backends_mine_the_same_user(synthetic_user):
+    for seed in range(3):
+        triples, subgraphs = mine(synthetic_user(seed=seed))
+        assert triples
+        assert mine(synthetic_user(seed=seed, backend='columnar')) == (triples, subgraphs)
@@ -0,0 +1,112 @@
+from src.candidates import IsoClassIndex
+from src.columnar import TripleColumns
+from src.fsm import FSMEngine
+from src.mapper import StringMapper
+from src.utils import Triple
+
+
+def class_counts(index):
+    """Class members, transaction counts and depth per code, plus the size and distinct-count indexes."""
+    classes = {code: (set(iso_class.members), dict(iso_class.tr_counts), iso_class.depth)
+               for code, iso_class in index.classes.items()}
+    by_distinct = {distinct: set(codes) for distinct, codes in index.by_distinct.items() if codes}
+    size_count = {size: count for size, count in index.size_count.items() if count}
+    return classes, by_distinct, size_count, index.max_size
+
+
+def state(it_hash):
+    return {tid: (t.subj_cl, t.subj_inst, t.prop, t.obj_cl, t.obj_inst) for tid, t in it_hash.items()}
+
+
+def check_levels(monkeypatch, engine):
+    """
+    Before every selection of the chunking loop (once per level), the maintained classes must
+    equal the classes of a fresh index over the same working triples, and the ITID_Freq_depth
+    entries written from the dirty set must equal a full rewrite. Returns the working triples
+    at the end of every level.
+    """
+    snapshots = []
+    select = IsoClassIndex.select
+
+    def checked_select(index, threshold):
+        fresh = IsoClassIndex(index.engine, dict(index.it_hash), dict(index.itid_tr))
+        assert class_counts(index) == class_counts(fresh)
+        snapshots.append(state(index.it_hash))
+
+        candi_it_tr, same_itids = select(index, threshold)
+        for tid, (code, _, _, _) in index.entry.items():
+            iso_class = index.classes[code]
+            if tid not in candi_it_tr:
+                assert engine.ITID_Freq_depth[tid] == [len(iso_class.tr_counts), '0', iso_class.depth, '0']
+        return candi_it_tr, same_itids
+
+    monkeypatch.setattr(IsoClassIndex, 'select', checked_select)
+    return snapshots
+
+
+def check_records(engine, states):
+    """Every candidate is recorded as it was at the start of its level (states[level - 1])."""
+    for tid, info in engine.Chunking_Result.items():
+        subj_cl, subj_inst, prop, obj_cl, obj_inst = states[int(info[0]) - 1][tid]
+        if subj_cl in engine.option_class_ids:
+            subj_inst = subj_cl
+        if obj_cl in engine.option_class_ids:
+            obj_inst = obj_cl
+        assert (info[1], info[2], info[3]) == (subj_inst, prop, obj_inst)
+
+
+def test_incremental_classes_match_a_recount(monkeypatch, synthetic_user):
+    workload = synthetic_user()
+    engine, it_hash, itid_tr, candidates = workload.with_candidates()
+    assert candidates
+
+    snapshots = check_levels(monkeypatch, engine)
+    original = state(it_hash)
+    engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=workload.threshold)
+    levels = max(int(info[0]) for info in engine.Chunking_Result.values())
+    assert levels >= 3
+    assert len(snapshots) == levels
+
+    # The caller's triples are left untouched (copy-on-write)
+    assert state(it_hash) == original
+    check_records(engine, [original] + snapshots[:-1])
+
+
+def test_relabeled_candidate_is_recorded_from_the_undo_log(monkeypatch):
+    # A selected class has one member per transaction, so candidates of one level only share a
+    # transaction when passed in directly: here both genres of a movie, in three transactions.
+    # Chunking the first relabels the movie of the second, which must be recorded from level_start.
+    mapper = StringMapper()
+    engine = FSMEngine(mapper)
+    movie, genre, has_genre = mapper.get_id('Movie'), mapper.get_id('Genre'), mapper.get_id('hasGenre')
+    engine.option_class_ids = {genre}
+
+    it_hash, itid_tr = {}, {}
+    for user in range(3):
+        for genre_name in ('Drama', 'Comedy'):
+            tid = len(it_hash) + 1
+            it_hash[tid] = Triple(tid, movie, mapper.get_id('m1'), has_genre, genre, mapper.get_id(genre_name))
+            itid_tr[tid] = mapper.get_id(f'user{user}')
+    candidates = {1, 2, 3, 4}
+    engine.label_candidates({tid: candidates for tid in candidates})
+
+    snapshots = check_levels(monkeypatch, engine)
+    original = state(it_hash)
+    engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=2)
+    assert state(it_hash) == original
+    assert [engine.Chunking_Result[tid][0] for tid in candidates] == ['1'] * 4
+    assert len(snapshots) >= 1
+
+    # The second genre of users 0 and 1 had its movie relabeled to the first's chunk before its turn,
+    # and is still recorded with the movie
+    assert snapshots[0].keys() == {5, 6}
+    assert [engine.Chunking_Result[tid][1] for tid in (2, 4)] == [mapper.get_id('m1')] * 2
+    check_records(engine, [original] + snapshots[:-1])
+
+    # The columnar backend keeps its own undo log and must record the same chunks
+    columnar = FSMEngine(mapper, backend='columnar')
+    columnar.option_class_ids = {genre}
+    columnar.label_candidates({tid: candidates for tid in candidates})
+    columnar.chunking(candidates=candidates, it_hash=TripleColumns.from_triples(it_hash, itid_tr), itid_tr=itid_tr,
+                      threshold=2)
+    assert columnar.Chunking_Result == engine.Chunking_Result
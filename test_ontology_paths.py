@@ -0,0 +1,39 @@
+from benchmarks.synthetic import SyntheticSchema
+from src.config import START_CLASS, MAX_DEPTH
+from src.fsm import FSMEngine
+from src.mapper import StringMapper
+
+
+def unpruned_paths(start_id, end_ids, graph, max_depth):
+    """Every path with fewer than max_depth properties, none repeated, in the same depth-first order."""
+    stack = [(start_id, [])]
+    while stack:
+        n, path = stack.pop()
+        if n in end_ids:
+            yield path
+            continue
+        if len(path) + 1 > max_depth - 1:
+            continue
+        for property_id, next_cl in graph.get(n, ()):
+            if property_id not in path:
+                stack.append((next_cl, path + [property_id]))
+
+
+def test_pruned_paths_match_unpruned_enumeration(tmp_path):
+    # Tree depth 2 below Movie, so the longest tree path from the start class has 3 properties;
+    # cross links add cycles, and the deeper limits leave room for detours that can never reach
+    # an end class in time
+    for seed in range(4):
+        schema = SyntheticSchema(fanout=3, depth=2, cross_links=4, seed=seed)
+        schema_file = str(tmp_path / f'schema_{seed}.csv')
+        schema.write(schema_file)
+
+        engine = FSMEngine(StringMapper())
+        _, graph, _ = engine.load_schema(schema_file)
+        start_id = engine.mapper.get_id(START_CLASS)
+        end_ids = {engine.mapper.get_id(cl) for cl in schema.end_classes}
+
+        for max_depth in (5, 8, MAX_DEPTH):
+            pruned = list(engine.iter_ontology_paths(start_id, end_ids, graph, max_depth))
+            assert pruned
+            assert pruned == list(unpruned_paths(start_id, end_ids, graph, max_depth))
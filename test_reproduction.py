@@ -1,4 +1,3 @@
-import pickle
 import os
 import sys
 import time
@@ -19,14 +18,14 @@ def test_reproduction():
     print(f"Pipeline finished in {elapsed_time:.4f} seconds.")
     
     # Check output for User 1
-    output_file = 'subgraphs/1_subgraphs.pkl'
-    if not os.path.exists(output_file):
-        print(f"Error: {output_file} not found.")
+    from src.config import RESULTS_DIR
+    if not os.path.exists(RESULTS_DIR):
+        print(f"Error: {RESULTS_DIR} not found.")
         return
 
-    print(f"Loading {output_file}...")
-    with open(output_file, 'rb') as f:
-        result = pickle.load(f)
+    print(f"Loading User 1 from {RESULTS_DIR}...")
+    from src.results import load_user_results
+    _, result = load_user_results(1)
 
     print("Result sample:")
     print(str(result)[:500])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from src import manifest, scheduling
+from src.data_loader import save_mapped_data, open_mapped_data
+from src.pipeline import pending_work
+
+
+def test_resumed_batches_shrink(tmp_path, monkeypatch):
+    # 200 users, the first 180 already finished; costs fall with the user ID as in longest-first order
+    rng = np.random.default_rng(0)
+    rows = []
+    for user_id in range(1, 201):
+        for event in range(int(rng.integers(5, 30))):
+            rows.append((user_id, int(rng.integers(1, 500)), 4.0, event))
+    frame = pd.DataFrame(rows, columns=['userId', 'tmdbId', 'rating', 'timestamp'])
+
+    directory = str(tmp_path / 'mapped')
+    save_mapped_data(frame, 'test', directory)
+    mapped = open_mapped_data(directory)
+
+    order = np.arange(len(mapped))
+    cost_of = {user_id: 1000 - user_id for user_id in mapped.user_ids.tolist()}
+    completed = {}
+    for user_id, start, end in mapped.user_slices():
+        if user_id <= 180:
+            completed[user_id] = {'user_id': user_id, 'ratings': manifest.ratings_fingerprint(mapped.user_frame(start, end)),
+                                  'run': 'run', 'status': 'done', 'outputs': []}
+
+    # The pending cost is known before any user's ratings are read for the manifest check
+    fingerprints = []
+    ratings_fingerprint = manifest.ratings_fingerprint
+    monkeypatch.setattr(manifest, 'ratings_fingerprint',
+                        lambda user_series: fingerprints.append(1) or ratings_fingerprint(user_series))
+    users, pending_cost = pending_work(mapped, order, completed, 'run', cost_of)
+    assert not fingerprints
+    users = list(users)
+    assert [user_id for user_id, _, _ in users] == list(range(181, 201))
+
+    # Sized by the cost of the whole run, the batches would stay at the cap
+    batches = [len(batch) for batch in scheduling.guided_batches(users, cost_of, pending_cost, 4, 16)]
+    assert sum(batches) == 20
+    assert max(batches) < 16
+    assert batches == sorted(batches, reverse=True)
+    assert batches[-3:] == [1, 1, 1]
@@ -0,0 +1,78 @@
+import numpy as np
+from src.config import START_CLASS
+from src.fsm import FSMEngine
+from src.mapper import StringMapper
+from src.suffix_cache import movie_suffixes
+
+SCHEMA = [
+    ('User', 'UserWatching', 'WatchingEvent'),
+    ('WatchingEvent', 'WatchingMovie', 'Movie'),
+    ('WatchingEvent', 'hasRating', 'Rating'),
+    ('Movie', 'hasGenre', 'Genre'),
+    ('Movie', 'hasCast', 'Person'),
+    ('Movie', 'hasCrew', 'Person'),
+    ('Movie', 'hasKeyword', 'Keyword'),
+]
+# Person and Genre are not end classes, so walks past a movie go on through them into other movies
+END_CLASSES = ['User', 'Rating', 'Keyword']
+
+
+def test_suffixes_through_shared_metadata_match_a_full_walk(tmp_path):
+    schema_file = str(tmp_path / 'schema.csv')
+    with open(schema_file, 'w') as f:
+        for i, (dom, prop, ran) in enumerate(SCHEMA):
+            f.write(f'P{i}^{dom}^{prop}^{ran}\n')
+
+    mapper = StringMapper()
+    get_id = mapper.get_id
+    engine = FSMEngine(mapper)
+    property_dict, graph, _ = engine.load_schema(schema_file)
+    paths, path_properties = engine.find_ontology_paths(START_CLASS, END_CLASSES, graph, 6)
+    prop = {mapper.get_str(p): p for _, p, _ in property_dict.values()}
+
+    # MOVI_1 and MOVI_2 share a cast member and a genre; MOVI_3 shares nothing
+    metadata = {
+        1: [('hasCast', 'Person', 'PERS_1'), ('hasGenre', 'Genre', 'GENR_1'), ('hasKeyword', 'Keyword', 'KEYW_1')],
+        2: [('hasCrew', 'Person', 'PERS_1'), ('hasGenre', 'Genre', 'GENR_1'), ('hasKeyword', 'Keyword', 'KEYW_2')],
+        3: [('hasCast', 'Person', 'PERS_3'), ('hasGenre', 'Genre', 'GENR_3'), ('hasKeyword', 'Keyword', 'KEYW_3')],
+    }
+    movie_triples = {movie: np.array([(get_id('Movie'), get_id(f'MOVI_{movie}'), prop[p], get_id(cl), get_id(inst))
+                                      for p, cl, inst in rows], dtype=np.int64)
+                     for movie, rows in metadata.items()}
+
+    triples = []
+    events = []
+    for movie in metadata:
+        event = get_id(f'U1_M{movie}')
+        triples.append((get_id('User'), get_id('USER_1'), prop['UserWatching'], get_id('WatchingEvent'), event))
+        triples.append((get_id('WatchingEvent'), event, prop['WatchingMovie'], get_id('Movie'), get_id(f'MOVI_{movie}')))
+        events.append((event, movie))
+    first_triple = {}
+    for event, movie in events:
+        first_triple[event] = len(triples)
+        triples.extend(map(tuple, movie_triples[movie].tolist()))
+    rows = [[tid] + list(triple) for tid, triple in enumerate(triples)]
+
+    def triple_paths(cached):
+        engine = FSMEngine(mapper)
+        engine.property_dict = dict(property_dict)
+        engine.ontology_path_list = list(paths)
+        engine.path_property_set = set(path_properties)
+        start_instances, _, engine.prop_triples_dict, engine.triple_index = engine.store_encoded_triples(rows, START_CLASS)
+        suffixes = None
+        if cached:
+            suffixes = {event: (first_triple[event], movie_suffixes(property_dict, paths, get_id(START_CLASS),
+                                                                    get_id('Movie'), get_id(f'MOVI_{movie}'),
+                                                                    movie_triples[movie]))
+                        for event, movie in events}
+        return engine.find_all_triple_paths(START_CLASS, start_instances, suffixes), engine.memoized_starts
+
+    full, _ = triple_paths(False)
+    cached, memoized = triple_paths(True)
+    assert cached == full
+
+    # Walks from MOVI_1 and MOVI_2 reach the other movie through the shared person and genre, so
+    # only MOVI_3's event takes its paths from the suffixes
+    assert memoized == 1
+    movie_2_triples = set(range(first_triple[get_id('U1_M2')], first_triple[get_id('U1_M2')] + 3))
+    assert any(movie_2_triples & set(path) for path in full[get_id('U1_M1')])
@@ -0,0 +1,22 @@
+from src.pipeline import export_thresholds
+
+
+def mine(workload, thresholds):
+    """A synthetic user mined once at the lowest threshold and exported for every threshold, as a sweep is."""
+    workload.threshold = min(thresholds)
+    engine, it_hash, itid_tr, candidates = workload.with_candidates()
+    if candidates is None:
+        return {}
+    engine.chunking(candidates=candidates, it_hash=it_hash, itid_tr=itid_tr, threshold=workload.threshold)
+    return export_thresholds(engine, engine.mapper, itid_tr, thresholds)
+
+
+def test_sweep_matches_single_threshold_runs(synthetic_user):
+    thresholds = [3, 5, 8]
+    for backend in ('object', 'columnar'):
+        for seed in (0, 2):
+            sweep = mine(synthetic_user(seed=seed, backend=backend), thresholds)
+            assert sorted(sweep) == thresholds
+            assert len({len(triples) for triples, _ in sweep.values()}) == len(thresholds)
+            for threshold in thresholds:
+                assert sweep[threshold] == mine(synthetic_user(seed=seed, backend=backend), [threshold])[threshold]